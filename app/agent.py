@@ -51,6 +51,20 @@ async def main(external_input=None):
         return f"Error: {e}"
 
 
+async def stream(external_input: str):
+    """Run the agent on `external_input`, yielding progress events and answer tokens as they arrive."""
+    with open("config/profiles.yaml", "r") as f:
+        profile = yaml.safe_load(f)
+        mcp_servers = profile.get("mcp_servers", [])
+
+    multi_mcp = MultiMCP(server_configs=mcp_servers)
+    await multi_mcp.initialize()
+
+    agent = AgentLoop(user_input=external_input, dispatcher=multi_mcp)
+    async for event in agent.run_stream():
+        yield event
+
+
 if __name__ == "__main__":
     asyncio.run(main())
 
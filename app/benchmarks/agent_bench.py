@@ -0,0 +1,264 @@
+# benchmarks/agent_bench.py → Offline agent benchmark
+# Role: Runs AgentLoop end to end against a local fake Ollama and tracks latency/cost regressions.
+
+# Responsibilities:
+
+# Start the deterministic LLM/embedding stand-in and point the agent and MCP servers at it
+
+# Index the bundled documents/ corpus with the fake embeddings (separate index dir)
+
+# Run every query in benchmarks/queries.yaml; record steps, wall time, LLM/tool calls and tokens
+
+# Write a JSON report and compare it to the stored baseline
+
+# Dependencies: benchmarks/fake_ollama.py, core/loop.py, core/session.py
+
+# Usage (from app/):
+#   python -m benchmarks.agent_bench                    # run, report, compare to baseline
+#   python -m benchmarks.agent_bench --save-baseline    # run and store as the new baseline
+#   python -m benchmarks.agent_bench --only dlf_capbridge --repeat 5 --llm-latency-ms 200
+
+# benchmarks/agent_bench.py
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import yaml
+
+from benchmarks.fake_ollama import FakeOllama
+
+APP_ROOT = Path(__file__).parent.parent.resolve()
+BENCH_DIR = APP_ROOT / "benchmarks"
+WORK_DIR = BENCH_DIR / ".work"
+QUERIES_FILE = BENCH_DIR / "queries.yaml"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+REPORT_FILE = WORK_DIR / "latest.json"
+
+BENCH_MODEL = "phi4"  # any Ollama-type entry in config/models.json; its URLs are rebased
+COUNT_METRICS = ("steps", "llm_calls", "tool_calls", "prompt_tokens", "completion_tokens")
+MIN_WALL_DELTA_S = 0.05  # ignore wall-time noise below this
+
+
+def benchmark_env(base_url: str) -> Dict[str, str]:
+    return {
+        "OLLAMA_BASE_URL": base_url,
+        "AGENT_TEXT_MODEL": BENCH_MODEL,
+        "DOCUMENT_INDEX_DIR": str(WORK_DIR / "faiss_index"),
+        "TOOL_EMBEDDINGS_CACHE": str(WORK_DIR / "tool_embeddings.json"),
+        "WEB_STATE_DB": str(WORK_DIR / "web_state.sqlite3"),
+        "AGENT_TRACE_FILE": str(WORK_DIR / "traces.jsonl"),
+    }
+
+
+def build_index(env: Dict[str, str], verbose: bool) -> float:
+    """Index documents/ with the fake embeddings; unchanged files are skipped on later runs."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "from mcp_server_2 import process_documents; process_documents()"],
+        cwd=APP_ROOT,
+        env={**os.environ, **env},
+        check=True,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+async def run_query(spec: dict, fake: FakeOllama, server_configs: List[dict], tool_map: dict, verbose: bool) -> dict:
+    from core.loop import AgentLoop
+    from core.session import MultiMCP, ToolResultCache
+
+    # Fresh result cache per run so every query measures real tool calls
+    dispatcher = MultiMCP(server_configs, cache=ToolResultCache())
+    dispatcher.tool_map = tool_map
+    tool_calls: List[str] = []
+    call_tool = dispatcher.call_tool
+
+    async def counting_call_tool(tool_name, arguments):
+        tool_calls.append(tool_name)
+        return await call_tool(tool_name, arguments)
+
+    dispatcher.call_tool = counting_call_tool
+
+    fake.reset()
+    agent = AgentLoop(user_input=spec["query"], dispatcher=dispatcher)
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        answer = await agent.run()
+    wall = time.perf_counter() - start
+
+    answer = answer.replace("FINAL_ANSWER:", "").strip()
+    usage = fake.snapshot()
+    return {
+        "wall_s": wall,
+        "steps": agent.context.step + 1,
+        "llm_calls": usage["llm_calls"],
+        "embedding_calls": usage["embedding_calls"],
+        "tool_calls": len(tool_calls),
+        "tools": tool_calls,
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "embedding_tokens": usage["embedding_tokens"],
+        "speculation": dict(agent.speculation_stats),
+        "controller": dict(agent.controller_stats),
+        "passed": all(e.lower() in answer.lower() for e in spec.get("expect", [])),
+        "answer": answer[:300],
+    }
+
+
+def summarize(runs: List[dict]) -> dict:
+    walls = [r["wall_s"] for r in runs]
+    last = runs[-1]
+    return {
+        **{k: v for k, v in last.items() if k != "wall_s"},
+        "wall_s": round(statistics.median(walls), 4),
+        "wall_min_s": round(min(walls), 4),
+        "wall_max_s": round(max(walls), 4),
+        "runs": len(runs),
+        "passed": all(r["passed"] for r in runs),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions: slower beyond tolerance, more steps/calls/tokens, or a newly failing query."""
+    regressions = []
+    for qid, current in report["queries"].items():
+        base = baseline.get("queries", {}).get(qid)
+        if base is None:
+            continue
+        if current["wall_s"] > base["wall_s"] * (1 + tolerance) and current["wall_s"] - base["wall_s"] > MIN_WALL_DELTA_S:
+            regressions.append(f"{qid}: wall {base['wall_s']:.2f}s → {current['wall_s']:.2f}s")
+        for metric in COUNT_METRICS:
+            if current[metric] > base[metric]:
+                regressions.append(f"{qid}: {metric} {base[metric]} → {current[metric]}")
+        if base["passed"] and not current["passed"]:
+            regressions.append(f"{qid}: answer no longer matches {base.get('expect', 'expectations')}")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict | None) -> None:
+    print(f"\n{'query':<22}{'pass':>6}{'steps':>7}{'wall s':>9}{'Δ wall':>9}{'llm':>6}{'tools':>7}{'tokens':>9}")
+    for qid, r in report["queries"].items():
+        base = (baseline or {}).get("queries", {}).get(qid)
+        delta = f"{(r['wall_s'] / base['wall_s'] - 1) * 100:+.0f}%" if base and base["wall_s"] else "-"
+        print(
+            f"{qid:<22}{'✅' if r['passed'] else '❌':>5}{r['steps']:>7}{r['wall_s']:>9.2f}{delta:>9}"
+            f"{r['llm_calls']:>6}{r['tool_calls']:>7}{r['prompt_tokens'] + r['completion_tokens']:>9}"
+        )
+    t = report["totals"]
+    print(
+        f"\nTotal: {t['passed']}/{t['queries']} passed, {t['wall_s']:.2f}s wall, "
+        f"{t['llm_calls']} LLM calls, {t['tool_calls']} tool calls, {t['tokens']} tokens "
+        f"(index build {report['index_build_s']:.1f}s, MCP init {report['mcp_init_s']:.1f}s)"
+    )
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline agent benchmark")
+    parser.add_argument("--queries", type=Path, default=QUERIES_FILE)
+    parser.add_argument("--only", nargs="+", help="query ids to run")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per query (wall time is the median)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per LLM call")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated latency per embedding")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed wall-time slowdown vs baseline")
+    parser.add_argument("--output", type=Path, default=REPORT_FILE)
+    parser.add_argument("--verbose", action="store_true", help="show agent and indexing logs")
+    args = parser.parse_args(argv)
+
+    specs = yaml.safe_load(args.queries.read_text())["queries"]
+    if args.only:
+        specs = [s for s in specs if s["id"] in args.only]
+
+    fake = FakeOllama(specs, llm_latency=args.llm_latency_ms / 1000, embed_latency=args.embed_latency_ms / 1000)
+    env = benchmark_env(fake.start())
+    # Set before the agent modules are imported: ModelManager reads them at import time
+    os.environ.update(env)
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    os.chdir(APP_ROOT)
+
+    print(f"📚 Indexing documents/ with fake embeddings → {env['DOCUMENT_INDEX_DIR']}")
+    index_build_s = build_index(env, args.verbose)
+
+    from core.session import MultiMCP
+    from modules.model_manager import ModelManager
+
+    profile = yaml.safe_load((APP_ROOT / "config" / "profiles.yaml").read_text())
+    server_configs = [{**c, "cwd": str(APP_ROOT), "env": env} for c in profile.get("mcp_servers", [])]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        setup = MultiMCP(server_configs)
+        await setup.initialize()
+    mcp_init_s = time.perf_counter() - start
+
+    results: Dict[str, Any] = {}
+    for spec in specs:
+        runs = [
+            await run_query(spec, fake, server_configs, setup.tool_map, args.verbose)
+            for _ in range(args.repeat)
+        ]
+        results[spec["id"]] = {**summarize(runs), "expect": spec.get("expect", [])}
+        print(f"⏱️ {spec['id']}: {results[spec['id']]['wall_s']:.2f}s, {'pass' if results[spec['id']]['passed'] else 'FAIL'}")
+    fake.stop()
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "model": BENCH_MODEL,
+            "repeat": args.repeat,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embed_latency_ms": args.embed_latency_ms,
+        },
+        "index_build_s": round(index_build_s, 3),
+        "mcp_init_s": round(mcp_init_s, 3),
+        "queries": results,
+        "routes": ModelManager.route_report(),
+        "totals": {
+            "queries": len(results),
+            "passed": sum(r["passed"] for r in results.values()),
+            "wall_s": round(sum(r["wall_s"] for r in results.values()), 4),
+            "llm_calls": sum(r["llm_calls"] for r in results.values()),
+            "tool_calls": sum(r["tool_calls"] for r in results.values()),
+            "tokens": sum(r["prompt_tokens"] + r["completion_tokens"] for r in results.values()),
+        },
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    print_report(report, baseline)
+    print(f"\n📝 Report: {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"📌 Saved baseline: {args.baseline}")
+        return 0
+    if baseline is None:
+        print("No baseline yet; run with --save-baseline to store one.")
+        return 0
+
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print("\n⚠️ Regressions vs baseline:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ No regressions vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
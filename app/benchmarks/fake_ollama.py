@@ -0,0 +1,213 @@
+# benchmarks/fake_ollama.py → Deterministic Ollama stand-in
+# Role: Serves /api/generate, /api/chat and /api/embeddings locally so the agent can be benchmarked offline.
+
+# Responsibilities:
+
+# Hashed bag-of-words embeddings (same text → same vector, shared words → nearby vectors)
+
+# Scripted planner: perception JSON, then each query's tool calls in order, then a final answer
+
+# Count calls and tokens per endpoint; optional artificial latency per call
+
+# Dependencies: numpy, modules/budget.py
+
+# Used by: benchmarks/agent_bench.py
+
+# benchmarks/fake_ollama.py
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from modules.budget import count_tokens
+
+EMBED_DIM = 768
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "to", "in", "on", "for", "is", "are", "was",
+    "be", "by", "with", "as", "at", "it", "this", "that", "what", "which", "how", "do",
+    "you", "we", "our", "his", "her", "their", "about", "via", "much",
+}
+
+
+def _feature(word: str, dim: int) -> tuple[int, float]:
+    digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+def embed_text(text: str, dim: int = EMBED_DIM) -> np.ndarray:
+    """Unit-length hashed term-frequency vector; no model needed and fully deterministic."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        idx, sign = _feature(word, dim)
+        vec[idx] += sign
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        vec[0] = 1.0
+        return vec
+    return vec / norm
+
+
+class FakeOllama:
+    """
+    `scripts` are benchmark queries: {"query": ..., "plan": [{"tool": ..., "arguments": {...}}, ...]}.
+    The planner replays a query's plan step by step, then answers with the last tool result.
+    """
+
+    def __init__(self, scripts: Optional[List[dict]] = None, llm_latency: float = 0.0, embed_latency: float = 0.0):
+        self.scripts = sorted(scripts or [], key=lambda s: -len(s["query"]))
+        self.llm_latency = llm_latency
+        self.embed_latency = embed_latency
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.reset()
+
+    # ------------------------------------------------------------------
+    # Accounting
+    # ------------------------------------------------------------------
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats: Dict[str, int] = {
+                "llm_calls": 0,
+                "embedding_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "embedding_tokens": 0,
+            }
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    # ------------------------------------------------------------------
+    # Model behaviour
+    # ------------------------------------------------------------------
+
+    def _script_for(self, text: str) -> Optional[dict]:
+        for script in self.scripts:
+            if script["query"].lower() in text.lower():
+                return script
+        return None
+
+    def _perceive(self, prompt: str) -> dict:
+        match = re.search(r'Input: "(.*)"\s*\n\s*Return the response', prompt, re.S)
+        user_input = match.group(1) if match else ""
+        script = self._script_for(user_input)
+        plan = script.get("plan", []) if script else []
+        query = script["query"] if script else user_input
+        return {
+            "intent": query[:80],
+            "entities": [w for w in re.findall(r"[A-Za-z][\w-]+", query) if w[0].isupper()],
+            "tool_hint": plan[0]["tool"] if plan else None,
+            "single_step": len(plan) == 1,
+            "user_input": user_input,
+        }
+
+    def _plan(self, prompt: str) -> dict:
+        match = re.search(r'- User input: "(.*?)"\n- Intent:', prompt, re.S)
+        user_input = match.group(1) if match else prompt
+        step_match = re.search(r"Step: (\d+) of", prompt)
+        step = int(step_match.group(1)) if step_match else 1
+
+        script = self._script_for(user_input)
+        plan = script.get("plan", []) if script else []
+        if step <= len(plan):
+            return {"name": plan[step - 1]["tool"], "arguments": plan[step - 1].get("arguments", {})}
+
+        result = re.search(r"Your last tool produced this result:\s*(.*?)\s*If this fully answers", user_input, re.S)
+        answer = " ".join(result.group(1).split())[:500] if result else "[unknown]"
+        return {"name": "final_answer", "arguments": {"answer": answer}}
+
+    def generate(self, body: dict) -> str:
+        prompt = body.get("prompt", "")
+        if body.get("images"):
+            reply = "A picture accompanying the document."
+        elif "Available functions (JSON Schema parameters)" in prompt:
+            reply = json.dumps(self._plan(prompt))
+        elif "extracts structured facts" in prompt:
+            reply = json.dumps(self._perceive(prompt))
+        else:
+            # Text-protocol planner fallback
+            call = self._plan(prompt)
+            reply = f"FINAL_ANSWER: {call['arguments'].get('answer', '[unknown]')}" if call["name"] == "final_answer" \
+                else "FINAL_ANSWER: [unknown]"
+        self._count(llm_calls=1, prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(reply))
+        time.sleep(self.llm_latency)
+        return reply
+
+    def chat(self, body: dict) -> str:
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        # are_related → keep chunks apart; semantic_merge → "only one topic"
+        reply = "No" if "Yes or No" in prompt else ""
+        self._count(llm_calls=1, prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(reply))
+        time.sleep(self.llm_latency)
+        return reply
+
+    def embed(self, text: str) -> List[float]:
+        self._count(embedding_calls=1, embedding_tokens=count_tokens(text))
+        time.sleep(self.embed_latency)
+        return embed_text(text).tolist()
+
+    # ------------------------------------------------------------------
+    # HTTP server
+    # ------------------------------------------------------------------
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a daemon thread; returns the base URL (use as OLLAMA_BASE_URL)."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/embeddings":
+                    payload = {"embedding": fake.embed(body.get("prompt", ""))}
+                elif self.path == "/api/embed":
+                    inputs = body.get("input", "")
+                    inputs = inputs if isinstance(inputs, list) else [inputs]
+                    payload = {"embeddings": [fake.embed(text) for text in inputs]}
+                elif self.path == "/api/generate":
+                    payload = {"model": body.get("model"), "response": fake.generate(body), "done": True}
+                elif self.path == "/api/chat":
+                    payload = {
+                        "model": body.get("model"),
+                        "message": {"role": "assistant", "content": fake.chat(body)},
+                        "done": True,
+                    }
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
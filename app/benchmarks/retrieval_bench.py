@@ -0,0 +1,345 @@
+# benchmarks/retrieval_bench.py → Retrieval micro-benchmark
+# Role: Measures how document search scales with corpus size and index type.
+
+# Responsibilities:
+
+# Generate synthetic corpora (seeded, clustered unit vectors) at 10k/100k/1M chunks
+
+# For each FAISS index type: build time, index size, RSS growth, p50/p99 query latency, recall@k vs exact search
+
+# Compare metadata loading: json.loads(metadata.json) vs the mmapped chunk store used by search_documents
+
+# Write a JSON report for trend tracking
+
+# Dependencies: faiss, numpy, mcp_server_2.py (chunk store)
+
+# Usage (from app/):
+#   python -m benchmarks.retrieval_bench                              # 10k, 100k, 1M
+#   python -m benchmarks.retrieval_bench --sizes 10000 --indexes Flat HNSW32
+#   python -m benchmarks.retrieval_bench --dim 384 --queries 200 --skip-metadata
+
+# benchmarks/retrieval_bench.py
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator
+
+import faiss
+import numpy as np
+
+APP_ROOT = Path(__file__).parent.parent.resolve()
+REPORT_DIR = APP_ROOT / "benchmarks" / ".work"
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_INDEXES = ["Flat", "SQ8", "HNSW32", "IVF{nlist},Flat", "IVF{nlist},PQ{pq_m}np"]
+BATCH = 50_000
+CLUSTERS = 256
+SEARCH_K = 5  # search_documents returns the top 5 chunks
+WORDS = ("revenue", "policy", "cricket", "apartment", "carbon", "patent", "course", "market", "fund", "growth")
+
+
+# ----------------------------------------------------------------------
+# Synthetic corpus
+# ----------------------------------------------------------------------
+
+def _centers(dim: int, seed: int) -> np.ndarray:
+    return np.random.default_rng([seed, 0]).standard_normal((CLUSTERS, dim)).astype(np.float32)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def corpus_batches(n: int, dim: int, seed: int) -> Iterator[np.ndarray]:
+    """Yield the corpus in batches; batch b is always the same vectors for a given seed."""
+    centers = _centers(dim, seed)
+    for b, start in enumerate(range(0, n, BATCH)):
+        rng = np.random.default_rng([seed, 1, b])
+        size = min(BATCH, n - start)
+        assign = rng.integers(0, CLUSTERS, size)
+        noise = rng.standard_normal((size, dim), dtype=np.float32)
+        yield _normalize(centers[assign] + 0.6 * noise)
+
+
+def make_queries(n: int, dim: int, count: int, seed: int) -> np.ndarray:
+    """Perturbed copies of corpus vectors, so every query has genuine near neighbours."""
+    first = next(corpus_batches(min(n, BATCH), dim, seed))
+    rng = np.random.default_rng([seed, 2])
+    picks = first[rng.integers(0, len(first), count)]
+    return _normalize(picks + 0.3 * rng.standard_normal(picks.shape, dtype=np.float32))
+
+
+def training_sample(n: int, dim: int, seed: int, size: int) -> np.ndarray:
+    parts, total = [], 0
+    for batch in corpus_batches(n, dim, seed):
+        parts.append(batch)
+        total += len(batch)
+        if total >= size:
+            break
+    return np.concatenate(parts)[:size]
+
+
+# ----------------------------------------------------------------------
+# Measurements
+# ----------------------------------------------------------------------
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is a high-water mark (KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def index_spec(template: str, n: int, dim: int) -> str:
+    # k-means wants at least 39 training points per centroid, and the sample can't exceed the corpus
+    nlist = max(1, min(max(16, int(4 * n ** 0.5)), n // 39))
+    pq_m = next(m for m in (96, 64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+    return template.format(nlist=nlist, pq_m=pq_m)
+
+
+def build_index(spec: str, n: int, dim: int, seed: int, workdir: Path) -> dict:
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+
+    index = faiss.index_factory(dim, spec)
+    train_s = 0.0
+    if not index.is_trained:
+        ivf = faiss.extract_index_ivf(index) if "IVF" in spec else None
+        if hasattr(ivf, "do_polysemous_training"):
+            # Polysemous codes are never used for search here and their training can run for hours
+            ivf.do_polysemous_training = False
+        sample = training_sample(n, dim, seed, max(256 * 40, ivf.nlist * 40) if ivf else 50_000)
+        t = time.perf_counter()
+        index.train(sample)
+        train_s = time.perf_counter() - t
+        del sample
+    for batch in corpus_batches(n, dim, seed):
+        index.add(batch)
+    build_s = time.perf_counter() - start
+
+    path = workdir / "index.bin"
+    faiss.write_index(index, str(path))
+    return {
+        "index": index,
+        "build_s": round(build_s, 3),
+        "train_s": round(train_s, 3),
+        "index_mb": round(path.stat().st_size / 2**20, 2),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def tune(index, spec: str) -> Dict[str, int]:
+    params = {}
+    if "HNSW" in spec:
+        index.hnsw.efSearch = 64
+        params["efSearch"] = 64
+    if "IVF" in spec:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(16, ivf.nlist)
+        params["nprobe"] = ivf.nprobe
+    return params
+
+
+def measure_search(index, queries: np.ndarray, k: int) -> dict:
+    # One query per call, as search_documents does
+    latencies, results = [], []
+    for q in queries:
+        t = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - t) * 1000)
+        results.append(ids[0])
+    t = time.perf_counter()
+    index.search(queries, k)
+    batch_s = time.perf_counter() - t
+    return {
+        "ids": np.stack(results),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "mean_ms": round(float(np.mean(latencies)), 4),
+        "batch_qps": round(len(queries) / batch_s, 1) if batch_s else None,
+    }
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(e)) for f, e in zip(found, exact))
+    return round(hits / exact.size, 4)
+
+
+# ----------------------------------------------------------------------
+# Metadata loading
+# ----------------------------------------------------------------------
+
+def synthetic_metadata(n: int, chunk_words: int, seed: int) -> Iterator[dict]:
+    rng = np.random.default_rng([seed, 3])
+    for i in range(n):
+        words = rng.choice(WORDS, chunk_words)
+        yield {"doc": f"doc_{i // 50}.md", "chunk": " ".join(words), "chunk_id": f"doc_{i // 50}_{i % 50}"}
+
+
+def measure_metadata(n: int, seed: int, chunk_words: int, flat_index: Path, queries_ids: np.ndarray, workdir: Path) -> dict:
+    """
+    Legacy path: read_index + json.loads(metadata.json) in every server process.
+    Current path: DocumentStore (mmapped index + chunk store) from mcp_server_2.
+    """
+    os.environ["DOCUMENT_INDEX_DIR"] = str(workdir / "docs")
+    import mcp_server_2 as docs  # reads DOCUMENT_INDEX_DIR at import
+
+    docs.INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    os.replace(flat_index, docs.INDEX_FILE)
+    with open(docs.METADATA_FILE, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, record in enumerate(synthetic_metadata(n, chunk_words, seed)):
+            f.write(("," if i else "") + json.dumps(record))
+        f.write("]")
+    metadata_mb = docs.METADATA_FILE.stat().st_size / 2**20
+
+    gc.collect()
+    rss_before = rss_mb()
+    t = time.perf_counter()
+    faiss.read_index(str(docs.INDEX_FILE))
+    metadata = json.loads(docs.METADATA_FILE.read_text())
+    legacy_load_s = time.perf_counter() - t
+    legacy_rss = rss_mb() - rss_before
+    del metadata
+    gc.collect()
+
+    t = time.perf_counter()
+    docs.write_chunk_store(json.loads(docs.METADATA_FILE.read_text()))
+    migrate_s = time.perf_counter() - t
+
+    gc.collect()
+    rss_before = rss_mb()
+    t = time.perf_counter()
+    store = docs.DocumentStore()
+    store_open_s = time.perf_counter() - t
+    store_rss = rss_mb() - rss_before
+
+    latencies = []
+    for ids in queries_ids:
+        t = time.perf_counter()
+        [store.record(int(i)) for i in ids if 0 <= i < len(store)]
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    return {
+        "chunk_words": chunk_words,
+        "metadata_json_mb": round(metadata_mb, 2),
+        "legacy_load_s": round(legacy_load_s, 4),
+        "legacy_rss_delta_mb": round(legacy_rss, 1),
+        "chunk_store_build_s": round(migrate_s, 3),
+        "store_open_s": round(store_open_s, 4),
+        "store_rss_delta_mb": round(store_rss, 1),
+        "record_fetch_p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "record_fetch_p99_ms": round(float(np.percentile(latencies, 99)), 4),
+    }
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+
+def run_size(n: int, args, workdir: Path) -> dict:
+    print(f"\n📦 {n:,} chunks × {args.dim} dims")
+    queries = make_queries(n, args.dim, args.queries, args.seed)
+    result: Dict[str, dict] = {"chunks": n, "indexes": {}}
+
+    exact = None
+    flat_index = workdir / "flat.bin"
+    templates = args.indexes if "Flat" in args.indexes else ["Flat", *args.indexes]
+    for template in templates:
+        spec = index_spec(template, n, args.dim)
+        try:
+            built = build_index(spec, n, args.dim, args.seed, workdir)
+        except (MemoryError, RuntimeError) as e:
+            print(f"  {spec:<20} skipped: {e}")
+            result["indexes"][spec] = {"error": str(e)}
+            continue
+        index = built.pop("index")
+        params = tune(index, spec)
+        search = measure_search(index, queries, args.k)
+        ids = search.pop("ids")
+        if spec == "Flat":
+            exact = ids  # exact search is the ground truth
+            os.replace(workdir / "index.bin", flat_index)
+        search["recall_at_k"] = recall_at_k(ids, exact) if exact is not None else None
+        result["indexes"][spec] = {**built, **search, "params": params}
+        r = result["indexes"][spec]
+        print(
+            f"  {spec:<20} build {r['build_s']:>8.2f}s  size {r['index_mb']:>8.1f} MB  "
+            f"p50 {r['p50_ms']:>7.3f} ms  p99 {r['p99_ms']:>7.3f} ms  recall@{args.k} {r['recall_at_k']}"
+        )
+        del index
+        gc.collect()
+
+    if not args.skip_metadata and exact is not None:
+        # The flat index is what process_documents writes and search_documents opens
+        result["metadata"] = measure_metadata(n, args.seed, args.chunk_words, flat_index, exact, workdir)
+        m = result["metadata"]
+        print(
+            f"  metadata {m['metadata_json_mb']:.1f} MB: json load {m['legacy_load_s']:.3f}s "
+            f"(+{m['legacy_rss_delta_mb']:.0f} MB) vs store open {m['store_open_s']:.4f}s "
+            f"(+{m['store_rss_delta_mb']:.0f} MB), fetch p99 {m['record_fetch_p99_ms']:.3f} ms"
+        )
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Retrieval micro-benchmark for the document index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--indexes", nargs="+", default=DEFAULT_INDEXES,
+                        help="faiss index_factory strings; {nlist} and {pq_m} are filled per size")
+    parser.add_argument("--dim", type=int, default=768, help="embedding size (nomic-embed-text: 768)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=SEARCH_K)
+    parser.add_argument("--chunk-words", type=int, default=256, help="words per synthetic chunk (CHUNK_SIZE)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-metadata", action="store_true")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="retrieval_bench_"))
+    try:
+        sizes = [run_size(n, args, workdir) for n in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "faiss": getattr(faiss, "__version__", "unknown"),
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "faiss_threads": faiss.omp_get_max_threads(),
+        },
+        "settings": {
+            "dim": args.dim, "queries": args.queries, "k": args.k,
+            "chunk_words": args.chunk_words, "seed": args.seed,
+        },
+        "sizes": sizes,
+    }
+    output = args.output or REPORT_DIR / f"retrieval_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\n📝 Report: {output}")
+
+
+if __name__ == "__main__":
+    main()
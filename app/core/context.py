@@ -23,6 +23,7 @@
 
 from typing import List, Optional, Dict, Any
 from modules.memory import MemoryManager, MemoryItem
+from modules.model_manager import ollama_url
 from pathlib import Path
 import yaml
 import time
@@ -42,6 +43,10 @@ class AgentProfile:
         self.memory_config = config["memory"]
         self.llm_config = config["llm"]
         self.persona = config["persona"]
+        self.tool_retrieval = config.get("tool_retrieval", {})
+        self.speculation = config.get("speculation", {})
+        self.controller = config.get("controller", {})
+        self.streaming = config.get("streaming", {})
 
     def __repr__(self):
         return f"<AgentProfile {self.name} ({self.strategy})>"
@@ -59,7 +64,7 @@ class AgentContext:
         self.session_id = f"session-{int(time.time())}-{uuid.uuid4().hex[:6]}"
         self.step = 0
         self.memory = MemoryManager(
-            embedding_model_url=self.agent_profile.memory_config["embedding_url"],
+            embedding_model_url=ollama_url(self.agent_profile.memory_config["embedding_url"]),
             model_name=self.agent_profile.memory_config["embedding_model"]
         )
         self.memory_trace: List[MemoryItem] = []
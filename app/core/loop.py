@@ -5,150 +5,379 @@ from core.context import AgentContext
 from core.session import MultiMCP
 from core.strategy import decide_next_action
 from modules.perception import extract_perception, PerceptionResult
-from modules.action import ToolCallResult, parse_function_call
+from modules.action import ToolCallResult
 from modules.memory import MemoryItem
+from modules.tools import ToolRegistry
+from modules.budget import PromptBudget, count_tokens
+from modules.tracing import span
+from typing import Any, AsyncIterator, Optional
 import json
+import re
+
+# A bare number (optionally signed, decimal or exponent) is a complete answer by itself
+_SCALAR = re.compile(r"^-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?$")
+# Evaluates the whole request as one expression, so its first result is the answer
+_WHOLE_REQUEST_TOOLS = {"evaluate_expression"}
 
 
 class AgentLoop:
+    # Speculation outcomes across every run in this process
+    speculation_totals = {"started": 0, "hits": 0, "misses": 0}
+
     def __init__(self, user_input: str, dispatcher: MultiMCP):
         self.context = AgentContext(user_input)
         self.mcp = dispatcher
         self.tools = dispatcher.get_all_tools()
+        self.registry = ToolRegistry.for_tools(self.tools)
+        self.budget = PromptBudget.for_model()
         self.final_response = None
+        self.speculation_stats = {"started": 0, "hits": 0, "misses": 0}
+        self._speculation: Optional[tuple] = None  # (call key, task)
+        self._speculated: set = set()
+        self.controller_stats = {"perception_skipped": 0, "repeat_calls": 0, "early_finish": 0}
+        self._results: dict = {}  # call key -> compressed result of every tool call this run
 
     def tool_expects_input(self, tool_name: str) -> bool:
-        tool = next((t for t in self.tools if getattr(t, "name", None) == tool_name), None)
-        if not tool:
-            return False
-        parameters = getattr(tool, "parameters", {})
-        return list(parameters.keys()) == ["input"]
-
-    
+        return self.registry.expects_input(tool_name)
+
+    @property
+    def speculation_hit_rate(self) -> float:
+        resolved = self.speculation_stats["hits"] + self.speculation_stats["misses"]
+        return self.speculation_stats["hits"] / resolved if resolved else 0.0
+
+    def _call_key(self, tool_name: str, arguments: dict) -> str:
+        """Tool + arguments with schema defaults filled in and strings whitespace/case-normalized."""
+        def normalize(value):
+            if isinstance(value, str):
+                return " ".join(value.split()).casefold()
+            if isinstance(value, dict):
+                return {k: normalize(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [normalize(v) for v in value]
+            return value
+
+        properties = self.registry.schemas.get(tool_name, {}).get("properties", {})
+        defaults = {name: prop["default"] for name, prop in properties.items() if "default" in prop}
+        return tool_name + json.dumps(normalize({**defaults, **arguments}), sort_keys=True, default=str)
+
+    def _controller(self, option: str) -> bool:
+        return bool(self.context.agent_profile.controller.get(option, False))
+
+    def _carry_perception(self, perception: PerceptionResult, query: str) -> PerceptionResult:
+        """The previous step's perception for the new query; the hint is dropped so it isn't repeated."""
+        return perception.model_copy(update={"user_input": query, "tool_hint": None})
+
+    @staticmethod
+    def _result_value(response) -> str:
+        """The tool's text output, unwrapped from a single-field result model like {"result": 3.5}."""
+        content = response.content if isinstance(response.content, list) else [response.content]
+        text = "".join(getattr(item, "text", "") for item in content).strip()
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return text
+        if isinstance(data, dict) and len(data) == 1:
+            data = next(iter(data.values()))
+        return str(data) if isinstance(data, (str, int, float)) else text
+
+    def _local_answer(self, value: str, tool_name: str, tool_steps: int,
+                      perception: PerceptionResult) -> Optional[str]:
+        """
+        A final answer decided without the LLM: the first tool call returned a bare number
+        and the task is known to need only that call, because perception said it is
+        single-step or the planner evaluated the whole request as one expression.
+        None when the planner is needed.
+        """
+        value = value.strip()
+        if tool_steps != 1 or not _SCALAR.match(value) or perception.single_step is False:
+            return None
+        if perception.single_step or tool_name in _WHOLE_REQUEST_TOOLS:
+            return f"FINAL_ANSWER: {value}"
+        return None
+
+    def _count_speculation(self, outcome: str) -> None:
+        self.speculation_stats[outcome] += 1
+        AgentLoop.speculation_totals[outcome] += 1
+
+    def _speculate(self, perception: PerceptionResult) -> None:
+        """
+        Start the hinted tool with the user's query while planning runs, if it is one
+        of the read-only tools listed under `speculation` in profiles.yaml.
+        """
+        config = self.context.agent_profile.speculation
+        tool_name = perception.tool_hint
+        if not config.get("enabled") or tool_name not in config.get("tools", []) or self.registry.get(tool_name) is None:
+            return
+        if "query" not in self.registry.schemas[tool_name].get("properties", {}):
+            return
+
+        arguments = {"query": self.context.user_input}
+        key = self._call_key(tool_name, arguments)
+        if key in self._speculated:
+            return
+        self._speculated.add(key)
+
+        async def prefetch():
+            with span("speculation", tool=tool_name):
+                return await self.mcp.call_tool(tool_name, arguments)
+
+        print(f"[speculation] Prefetching {tool_name}({arguments})")
+        self._count_speculation("started")
+        self._speculation = (key, asyncio.create_task(prefetch()))
+
+    async def _claim_speculation(self, plan) -> Optional[Any]:
+        """The prefetched response if `plan` makes exactly that call; otherwise cancel it."""
+        if self._speculation is None:
+            return None
+        key, task = self._speculation
+        self._speculation = None
+
+        if plan is not None and plan.kind == "function_call" and self._call_key(plan.tool_name, plan.arguments) == key:
+            try:
+                response = await task
+            except Exception as e:
+                print(f"[speculation] ⚠️ Prefetch failed, calling the tool normally: {e}")
+                self._count_speculation("misses")
+                return None
+            self._count_speculation("hits")
+            print(f"[speculation] Hit: reusing prefetched {plan.tool_name} result")
+            return response
+
+        task.cancel()
+        self._count_speculation("misses")
+        print("[speculation] Miss: plan differs from prefetch, discarded")
+        return None
 
     async def run(self) -> str:
+        async for _ in self.run_stream(stream_answer=False):
+            pass
+        return self.context.final_answer or "FINAL_ANSWER: [no result]"
+
+    async def run_stream(self, stream_answer: Optional[bool] = None) -> AsyncIterator[dict]:
+        """
+        Run the agent and yield progress events: step, perception, plan, tool_start,
+        tool_end, answer_token and finally {"type": "final", "answer": ...}.
+        With `stream_answer` (default: the profile's streaming.answer_tokens), FINAL_ANSWER
+        text arrives as answer_token events while the model is still writing it; planning
+        then uses the text protocol instead of native function calling.
+        """
+        if stream_answer is None:
+            stream_answer = bool(self.context.agent_profile.streaming.get("answer_tokens", True))
+        with span("agent.run", session=self.context.session_id) as run_span:
+            print(f"[trace] {run_span.trace_id}")
+            try:
+                async for event in self._steps(stream_answer):
+                    yield event
+            finally:
+                await self._claim_speculation(None)
+            run_span.set(steps=self.context.step + 1, **self.controller_stats)
+            if any(self.controller_stats.values()):
+                print(f"[controller] {self.controller_stats}")
+            if self.speculation_stats["started"]:
+                print(f"[speculation] {self.speculation_stats}, hit rate {self.speculation_hit_rate:.0%}")
+                run_span.set(speculation_hits=self.speculation_stats["hits"],
+                             speculation_misses=self.speculation_stats["misses"])
+
+        answer = self.context.final_answer or "FINAL_ANSWER: [no result]"
+        yield {"type": "final", "answer": answer.replace("FINAL_ANSWER:", "").strip()}
+
+    async def _plan_events(self, perception: PerceptionResult, memory_items: list, stream_answer: bool) -> AsyncIterator[dict]:
+        """Plan the next step; with `stream_answer`, relay FINAL_ANSWER tokens while planning runs."""
+        kwargs = dict(context=self.context, perception=perception, memory_items=memory_items, registry=self.registry)
+        if not stream_answer:
+            yield {"type": "planned", "plan": await decide_next_action(**kwargs)}
+            return
+
+        tokens: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(decide_next_action(**kwargs, on_answer_token=tokens.put))
+        while not (task.done() and tokens.empty()):
+            getter = asyncio.ensure_future(tokens.get())
+            await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield {"type": "answer_token", "text": getter.result()}
+            else:
+                getter.cancel()
+        yield {"type": "planned", "plan": task.result()}
+
+    async def _steps(self, stream_answer: bool) -> AsyncIterator[dict]:
         print(f"[agent] Starting session: {self.context.session_id}")
 
         try:
             max_steps = self.context.agent_profile.max_steps
             query = self.context.user_input
+            perception: Optional[PerceptionResult] = None
+            last_call_ok = False
+            tool_steps = 0
 
             for step in range(max_steps):
                 self.context.step = step
                 print(f"[loop] Step {step + 1} of {max_steps}")
-
-                # 🧠 Perception
-                perception_raw = await extract_perception(query)
-
-
-                # ✅ Exit cleanly on FINAL_ANSWER
-                # ✅ Handle string outputs safely before trying to parse
-                if isinstance(perception_raw, str):
-                    pr_str = perception_raw.strip()
-                    
-                    # Clean exit if it's a FINAL_ANSWER
-                    if pr_str.startswith("FINAL_ANSWER:"):
-                        self.context.final_answer = pr_str
-                        break
-
-                    # Detect LLM echoing the prompt
-                    if "Your last tool produced this result" in pr_str or "Original user task:" in pr_str:
-                        print("[perception] ⚠️ LLM likely echoed prompt. No actionable plan.")
-                        self.context.final_answer = "FINAL_ANSWER: [no result]"
-                        break
-
-                    # Try to decode stringified JSON if it looks valid
-                    try:
-                        perception_raw = json.loads(pr_str)
-                    except json.JSONDecodeError:
-                        print("[perception] ⚠️ LLM response was neither valid JSON nor actionable text.")
-                        self.context.final_answer = "FINAL_ANSWER: [no result]"
-                        break
-
-
-                # ✅ Try parsing PerceptionResult
-                if isinstance(perception_raw, PerceptionResult):
-                    perception = perception_raw
+                yield {"type": "step", "step": step + 1, "max_steps": max_steps}
+
+                # 🧠 Perception — skipped while the previous intent still holds
+                if perception is not None and perception.intent and last_call_ok and self._controller("reuse_perception"):
+                    perception = self._carry_perception(perception, query)
+                    self.controller_stats["perception_skipped"] += 1
+                    print(f"[perception] Reusing intent: {perception.intent}")
+                    yield {"type": "perception", "intent": perception.intent, "tool_hint": None, "reused": True}
                 else:
-                    try:
-                        # Attempt to parse stringified JSON if needed
-                        if isinstance(perception_raw, str):
-                            perception_raw = json.loads(perception_raw)
-                        perception = PerceptionResult(**perception_raw)
-                    except Exception as e:
-                        print(f"[perception] ⚠️ LLM perception failed: {e}")
-                        print(f"[perception] Raw output: {perception_raw}")
-                        break
+                    with span("perception", step=step):
+                        perception_raw = await extract_perception(query)
+
+                    # ✅ Handle string outputs safely before trying to parse
+                    if isinstance(perception_raw, str):
+                        pr_str = perception_raw.strip()
+
+                        # Clean exit if it's a FINAL_ANSWER
+                        if pr_str.startswith("FINAL_ANSWER:"):
+                            self.context.final_answer = pr_str
+                            break
+
+                        # Detect LLM echoing the prompt
+                        if "Your last tool produced this result" in pr_str or "Original user task:" in pr_str:
+                            print("[perception] ⚠️ LLM likely echoed prompt.")
+                            perception_raw = None
+                        else:
+                            # Try to decode stringified JSON if it looks valid
+                            try:
+                                perception_raw = json.loads(pr_str)
+                            except json.JSONDecodeError:
+                                print("[perception] ⚠️ LLM response was neither valid JSON nor actionable text.")
+                                perception_raw = None
+
+                    # ✅ Try parsing PerceptionResult; an unusable one no longer ends the run
+                    if isinstance(perception_raw, PerceptionResult):
+                        perception = perception_raw
+                    else:
+                        try:
+                            perception = PerceptionResult(**perception_raw)
+                        except Exception as e:
+                            print(f"[perception] ⚠️ LLM perception failed, planning without it: {e}")
+                            perception = (
+                                self._carry_perception(perception, query) if perception is not None
+                                else PerceptionResult(user_input=query, intent=None)
+                            )
 
-                print(f"[perception] Intent: {perception.intent}, Hint: {perception.tool_hint}")
+                    print(f"[perception] Intent: {perception.intent}, Hint: {perception.tool_hint}")
+                    yield {"type": "perception", "intent": perception.intent, "tool_hint": perception.tool_hint}
+
+                # 🔮 Speculative prefetch of a read-only hinted tool, overlapping planning
+                self._speculate(perception)
 
                 # 💾 Memory Retrieval
-                retrieved = self.context.memory.retrieve(
-                    query=query,
-                    top_k=self.context.agent_profile.memory_config["top_k"],
-                    type_filter=self.context.agent_profile.memory_config.get("type_filter", None),
-                    session_filter=self.context.session_id
-                )
+                with span("memory.retrieve", step=step):
+                    retrieved = await asyncio.to_thread(
+                        self.context.memory.retrieve,
+                        query=query,
+                        top_k=self.context.agent_profile.memory_config["top_k"],
+                        type_filter=self.context.agent_profile.memory_config.get("type_filter", None),
+                        session_filter=self.context.session_id
+                    )
                 print(f"[memory] Retrieved {len(retrieved)} memories")
 
                 # 📊 Planning (via strategy)
-                plan = await decide_next_action(
-                    context=self.context,
-                    perception=perception,
-                    memory_items=retrieved,
-                    all_tools=self.tools
-                )
+                with span("plan", step=step) as plan_span:
+                    async for event in self._plan_events(perception, retrieved, stream_answer):
+                        if event["type"] == "planned":
+                            plan = event["plan"]
+                        else:
+                            yield event
+                    plan_span.set(kind=plan.kind, tool=plan.tool_name)
                 print(f"[plan] {plan}")
+                yield {"type": "plan", "kind": plan.kind, "tool": plan.tool_name, "text": str(plan)}
+                speculative_response = await self._claim_speculation(plan)
 
-                if "FINAL_ANSWER:" in plan:
-                    # Optionally extract the final answer portion
-                    final_lines = [line for line in plan.splitlines() if line.strip().startswith("FINAL_ANSWER:")]
-                    if final_lines:
-                        self.context.final_answer = final_lines[-1].strip()
-                    else:
-                        self.context.final_answer = "FINAL_ANSWER: [result found, but could not extract]"
+                if plan.kind == "final_answer":
+                    self.context.final_answer = str(plan)
                     break
 
 
                 # ⚙️ Tool Execution
                 try:
-                    tool_name, arguments = parse_function_call(plan)
+                    # Arguments were already validated against the tool's inputSchema
+                    tool_name, arguments = plan.tool_name, plan.arguments
 
                     if self.tool_expects_input(tool_name):
                         tool_input = {'input': arguments} if not (isinstance(arguments, dict) and 'input' in arguments) else arguments
                     else:
                         tool_input = arguments
 
-                    response = await self.mcp.call_tool(tool_name, tool_input)
-
-                    # ✅ Safe TextContent parsing
-                    raw = getattr(response.content, 'text', str(response.content))
-                    try:
-                        result_obj = json.loads(raw) if raw.strip().startswith("{") else raw
-                    except json.JSONDecodeError:
-                        result_obj = raw
-
-                    result_str = result_obj.get("markdown") if isinstance(result_obj, dict) else str(result_obj)
-                    print(f"[action] {tool_name} → {result_str}")
-
-                    # 🧠 Add memory
-                    memory_item = MemoryItem(
-                        text=f"{tool_name}({arguments}) → {result_str}",
-                        type="tool_output",
-                        tool_name=tool_name,
-                        user_query=query,
-                        tags=[tool_name],
-                        session_id=self.context.session_id
-                    )
-                    self.context.add_memory(memory_item)
+                    call_key = self._call_key(tool_name, arguments)
+                    repeated = call_key in self._results and self._controller("reuse_repeated_calls")
+                    yield {"type": "tool_start", "tool": tool_name, "arguments": arguments,
+                           "speculative": speculative_response is not None, "repeated": repeated}
+
+                    answer = None
+                    if repeated:
+                        # 🔂 Same call as an earlier step: reuse its result instead of calling the tool again
+                        result_str = self._results[call_key]
+                        self.controller_stats["repeat_calls"] += 1
+                        print(f"[controller] Repeated {tool_name} call, reusing its earlier result")
+                    else:
+                        if speculative_response is not None:
+                            response = speculative_response
+                        else:
+                            response = await self.mcp.call_tool(tool_name, tool_input)
+
+                        # ✅ Safe TextContent parsing
+                        raw = getattr(response.content, 'text', str(response.content))
+                        try:
+                            result_obj = json.loads(raw) if raw.strip().startswith("{") else raw
+                        except json.JSONDecodeError:
+                            result_obj = raw
+
+                        result_str = result_obj.get("markdown") if isinstance(result_obj, dict) else str(result_obj)
+                        print(f"[action] {tool_name} → {result_str}")
+
+                        # ✂️ Keep oversized results (whole PDFs, web pages) within the prompt budget
+                        full_tokens = count_tokens(result_str)
+                        with span("budget.compress", tokens=full_tokens):
+                            # Off the event loop: compression embeds the passages over HTTP
+                            result_str = await asyncio.to_thread(
+                                self.budget.compress,
+                                result_str, query=self.context.user_input, embed=self.context.memory.embed_batch,
+                            )
+                        if count_tokens(result_str) < full_tokens:
+                            print(f"[budget] Compressed {tool_name} result: {full_tokens} → {count_tokens(result_str)} tokens")
+
+                        last_call_ok = not getattr(response, "isError", False) and not result_str.lstrip().lower().startswith("error")
+                        if last_call_ok:
+                            self._results[call_key] = result_str
+                            tool_steps += 1
+                            if self._controller("early_finish"):
+                                answer = self._local_answer(self._result_value(response), tool_name, tool_steps, perception)
+
+                        # 🧠 Add memory
+                        memory_item = MemoryItem(
+                            text=f"{tool_name}({arguments}) → {result_str}",
+                            type="tool_output",
+                            tool_name=tool_name,
+                            user_query=query,
+                            tags=[tool_name],
+                            session_id=self.context.session_id
+                        )
+                        with span("memory.add"):
+                            self.context.add_memory(memory_item)
+                    yield {"type": "tool_end", "tool": tool_name, "result": result_str[:500]}
+
+                    # 🏁 Cheap local check: a bare value that completes the task needs no planner round
+                    if answer is not None:
+                        self.controller_stats["early_finish"] += 1
+                        print(f"[controller] Finishing early: {answer}")
+                        self.context.final_answer = answer
+                        break
 
                     # 🔁 Next query
+                    repeat_note = (
+                        f"\n    You already called {tool_name} with these arguments; do not call it again.\n"
+                        if repeated else ""
+                    )
                     query = f"""Original user task: {self.context.user_input}
 
     Your last tool produced this result:
 
     {result_str}
-
+{repeat_note}
     If this fully answers the task, return:
     FINAL_ANSWER: your answer
 
@@ -160,6 +389,4 @@ class AgentLoop:
         except Exception as e:
             print(f"[agent] Session failed: {e}")
 
-        return self.context.final_answer or "FINAL_ANSWER: [no result]"
-
 
@@ -2,9 +2,14 @@
 
 import os
 import sys
+import json
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
 from typing import Optional, Any, List, Dict
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from modules.tracing import span, current_traceparent
 
 
 class MCP:
@@ -47,15 +52,83 @@ class MCP:
                 return await session.call_tool(tool_name, arguments=arguments)
 
 
+class ToolResultCache:
+    """
+    LRU cache of tool results keyed by tool name, server epoch, canonical
+    arguments and the mtime/size of any files the result depends on.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, tuple[Optional[float], Any]]" = OrderedDict()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @staticmethod
+    def canonical(arguments: Any) -> str:
+        return json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+            self.entries.move_to_end(key)
+            self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+            return entry[1]
+        if entry is not None:
+            del self.entries[key]
+        self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+        return None
+
+    def put(self, key: tuple, value: Any, ttl: Optional[float]) -> None:
+        self.entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "entries": len(self.entries),
+            "per_tool": {
+                name: {"hits": self.hits.get(name, 0), "misses": self.misses.get(name, 0)}
+                for name in sorted(set(self.hits) | set(self.misses))
+            },
+        }
+
+
+# Shared across MultiMCP instances so repeated agent runs in one process reuse results
+tool_result_cache = ToolResultCache()
+
+
 class MultiMCP:
     """
     Stateless version: discovers tools from multiple MCP servers, but reconnects per tool call.
     Each call_tool() uses a fresh session based on tool-to-server mapping.
     """
 
-    def __init__(self, server_configs: List[dict]):
+    def __init__(self, server_configs: List[dict], cache: Optional[ToolResultCache] = tool_result_cache):
         self.server_configs = server_configs
-        self.tool_map: Dict[str, Dict[str, Any]] = {}  # tool_name → {config, tool}
+        self.tool_map: Dict[str, Dict[str, Any]] = {}  # tool_name → {config, tool, cache_policy, epoch}
+        self.cache = cache
+
+    @staticmethod
+    def _server_env(config: dict) -> Optional[Dict[str, str]]:
+        """Per-server `env` from the config on top of ours; None keeps the SDK's default environment."""
+        if not config.get("env"):
+            return None
+        return {**os.environ, **{k: str(v) for k, v in config["env"].items()}}
+
+    @staticmethod
+    async def _read_cache_policy(session: ClientSession) -> dict:
+        """Servers opt in to result caching via a cache://tools resource."""
+        try:
+            result = await session.read_resource("cache://tools")
+            return json.loads(result.contents[0].text)
+        except Exception:
+            return {}
 
     async def initialize(self):
         print("in MultiMCP initialize")
@@ -64,7 +137,8 @@ class MultiMCP:
                 params = StdioServerParameters(
                     command=sys.executable,
                     args=[config["script"]],
-                    cwd=config.get("cwd", os.getcwd())
+                    cwd=config.get("cwd", os.getcwd()),
+                    env=self._server_env(config),
                 )
                 print(f"→ Scanning tools from: {config['script']} in {params.cwd}")
                 async with stdio_client(params) as (read, write):
@@ -76,10 +150,13 @@ class MultiMCP:
                             print("[agent] MCP session initialized")
                             tools = await session.list_tools()
                             print(f"→ Tools received: {[tool.name for tool in tools.tools]}")
+                            policy = await self._read_cache_policy(session)
                             for tool in tools.tools:
                                 self.tool_map[tool.name] = {
                                     "config": config,
-                                    "tool": tool
+                                    "tool": tool,
+                                    "cache_policy": policy.get("tools", {}).get(tool.name),
+                                    "epoch": policy.get("epoch"),
                                 }
                     except Exception as se:
                         print(f"❌ Session error: {se}")
@@ -105,16 +182,88 @@ class MultiMCP:
         
         print("in MultiMCP call_tool", entry)
         config = entry["config"]
-        params = StdioServerParameters(
-            command=sys.executable,
-            args=[config["script"]],
-            cwd=config.get("cwd", os.getcwd())
+
+        with span("mcp.call_tool", tool=tool_name, server=config["script"]) as call_span:
+            cache_key = self._cache_key(tool_name, arguments, entry)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    print(f"[cache] Hit for {tool_name}")
+                    call_span.set(cache="hit")
+                    return cached
+            call_span.set(cache="miss" if cache_key is not None else "off")
+
+            params = StdioServerParameters(
+                command=sys.executable,
+                args=[config["script"]],
+                cwd=config.get("cwd", os.getcwd()),
+                env=self._server_env(config),
+            )
+
+            async with AsyncExitStack() as stack:
+                with span("mcp.spawn"):
+                    read, write = await stack.enter_async_context(stdio_client(params))
+                    session = await stack.enter_async_context(ClientSession(read, write))
+                    await session.initialize()
+                with span("mcp.request"):
+                    result = await self._send_call(session, tool_name, arguments)
+
+            if cache_key is not None and self._cacheable(result):
+                self.cache.put(cache_key, result, entry["cache_policy"].get("ttl"))
+            return result
+
+    @staticmethod
+    async def _send_call(session: ClientSession, tool_name: str, arguments: dict) -> types.CallToolResult:
+        """session.call_tool, plus the current traceparent in the request's _meta."""
+        traceparent = current_traceparent()
+        if traceparent is None:
+            return await session.call_tool(tool_name, arguments)
+        request = types.ClientRequest(
+            types.CallToolRequest(
+                method="tools/call",
+                params=types.CallToolRequestParams(
+                    name=tool_name, arguments=arguments, _meta={"traceparent": traceparent}
+                ),
+            )
         )
+        return await session.send_request(request, types.CallToolResult)
 
-        async with stdio_client(params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                return await session.call_tool(tool_name, arguments)
+    def _cache_key(self, tool_name: str, arguments: dict, entry: Dict[str, Any]) -> Optional[tuple]:
+        policy = entry.get("cache_policy")
+        if self.cache is None or policy is None:
+            return None
+
+        cwd = entry["config"].get("cwd", os.getcwd())
+        paths = list(policy.get("depends_on", []))  # e.g. an index the server may rebuild
+        if policy.get("file_arg"):
+            value = arguments
+            for part in policy["file_arg"].split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            if not isinstance(value, str):
+                return None
+            paths.append(value)
+
+        file_stamp = []
+        for path in paths:
+            try:
+                stat = os.stat(os.path.join(cwd, path))
+            except OSError:
+                return None
+            file_stamp.append((stat.st_mtime_ns, stat.st_size))
+
+        return (tool_name, entry.get("epoch"), self.cache.canonical(arguments), tuple(file_stamp) or None)
+
+    @staticmethod
+    def _cacheable(result: Any) -> bool:
+        if getattr(result, "isError", False):
+            return False
+        # Servers report many failures as plain text ("Error: ...", "ERROR: ...")
+        first = next(iter(getattr(result, "content", None) or []), None)
+        text = getattr(first, "text", "") or ""
+        return not text.lstrip().lower().startswith("error")
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache is not None else {}
 
     async def list_all_tools(self) -> List[str]:
         return list(self.tool_map.keys())
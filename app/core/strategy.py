@@ -25,22 +25,24 @@
 
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
-from modules.tools import summarize_tools, filter_tools_by_hint
-from modules.decision import generate_plan
+from modules.tools import ToolRegistry
+from modules.decision import generate_plan, Plan
 from core.context import AgentContext
-from typing import Any
+from typing import Any, Awaitable, Callable, Optional
 
 
 async def decide_next_action(
     context: AgentContext,
     perception: PerceptionResult,
     memory_items: list[MemoryItem],
-    all_tools: list[Any],
+    registry: ToolRegistry,
     last_result: str = "",
-) -> str:
+    on_answer_token: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Plan:
     """
     Decides what to do next using the planning strategy defined in agent profile.
     Wraps around the `generate_plan()` logic with strategy-aware control.
+    `on_answer_token` receives FINAL_ANSWER text as it streams from the model.
     """
 
     strategy = context.agent_profile.strategy
@@ -48,9 +50,23 @@ async def decide_next_action(
     max_steps = context.agent_profile.max_steps
     tool_hint = perception.tool_hint
 
-    # Step 1: Try hint-based filtered tools first
-    filtered_tools = filter_tools_by_hint(all_tools, hint=tool_hint)
-    filtered_summary = summarize_tools(filtered_tools)
+    # Step 1: Try hint-based filtered tools first (cached per hint in the registry)
+    filtered_tools = registry.filter_by_hint(tool_hint)
+    filtered_summary = registry.summarize(tool_hint)
+
+    # Step 2: Add the top-N tools nearest to the perception, so a large catalog
+    # never falls back to describing every tool
+    retrieval = context.agent_profile.tool_retrieval
+    top_n = retrieval.get("top_n", 8)
+    if retrieval.get("enabled") and len(registry.tools) > top_n:
+        try:
+            index = registry.tool_index(context.memory.embed, context.memory.model_name)
+            query = " ".join(filter(None, [perception.user_input, perception.intent, tool_hint, *perception.entities]))
+            hinted = filtered_tools if len(filtered_tools) < len(registry.tools) else []
+            filtered_tools = list({t.name: t for t in hinted + index.search(query, top_n)}.values())
+            filtered_summary = registry.summarize_tools(filtered_tools)
+        except Exception as e:
+            print(f"[strategy] ⚠️ Tool retrieval failed, using hint filter: {e}")
 
     plan = await generate_plan(
         perception=perception,
@@ -58,21 +74,26 @@ async def decide_next_action(
         tool_descriptions=filtered_summary,
         step_num=step,
         max_steps=max_steps,
+        tools=filtered_tools,
+        registry=registry,
+        on_answer_token=on_answer_token,
     )
 
     # Strategy enforcement
     if strategy == "conservative":
         return plan
 
-    if strategy == "retry_once" and "unknown" in plan.lower():
+    if strategy == "retry_once" and plan.kind == "final_answer" and "unknown" in (plan.answer or "").lower():
         # Retry with all tools if hint-based filtering failed
-        full_summary = summarize_tools(all_tools)
-        return generate_plan(
+        return await generate_plan(
             perception=perception,
             memory_items=memory_items,
-            tool_descriptions=full_summary,
+            tool_descriptions=registry.full_summary,
             step_num=step,
             max_steps=max_steps,
+            tools=registry.tools,
+            registry=registry,
+            on_answer_token=on_answer_token,
         )
 
     # Placeholder for future "explore_all" parallel planner
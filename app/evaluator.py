@@ -0,0 +1,209 @@
+# evaluator.py → Safe arithmetic expression evaluator
+# Role: Lets the planner collapse a chain of math tool calls into one expression.
+
+# Responsibilities:
+
+# Parse expressions and reject any AST node or name outside a whitelist
+
+# Expose math/NumPy functions, exact big ints and optional Decimal arithmetic
+
+# Guard against runaway powers/factorials/combinatorics and cache compiled expressions
+
+# Used by: mcp_server_1.py
+
+import ast
+import math
+from types import SimpleNamespace
+from decimal import Decimal, localcontext
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_POWER_BITS = 100_000  # cap on the estimated size of integer powers
+MAX_FACTORIAL = 10_000    # also where mcp_server_1's factorial tools switch to an approximation
+MAX_SEQUENCE = 100_000    # cap on list/tuple repetition
+
+
+def _safe_pow(base, exp):
+    if isinstance(base, int) and isinstance(exp, int) and exp > 0:
+        if max(base.bit_length(), 1) * exp > MAX_POWER_BITS:
+            raise ValueError(f"Result of {base}**{exp} is too large")
+    return base ** exp
+
+
+def _safe_mul(a, b):
+    for seq, times in ((a, b), (b, a)):
+        if isinstance(seq, (list, tuple)) and isinstance(times, int) and len(seq) * times > MAX_SEQUENCE:
+            raise ValueError("Sequence repetition is too large")
+    return a * b
+
+
+def _safe_factorial(n):
+    n = int(n)
+    if n > MAX_FACTORIAL:
+        raise ValueError(f"factorial({n}) is too large (limit {MAX_FACTORIAL})")
+    return math.factorial(n)
+
+
+def _check_product_size(name: str, n: int, terms: int) -> None:
+    # comb/perm multiply `terms` factors of at most n: bounded by terms * bits(n)
+    if terms > 0 and terms * max(n.bit_length(), 1) > MAX_POWER_BITS:
+        raise ValueError(f"Result of {name}({n}, ...) is too large")
+
+
+def _safe_comb(n, k):
+    n, k = int(n), int(k)
+    _check_product_size("comb", n, min(k, n - k))
+    return math.comb(n, k)
+
+
+def _safe_perm(n, k=None):
+    n = int(n)
+    k = n if k is None else int(k)
+    _check_product_size("perm", n, min(k, n))
+    return math.perm(n, k)
+
+
+FUNCTIONS: Dict[str, Any] = {
+    name: getattr(math, name)
+    for name in (
+        "sqrt", "cbrt", "exp", "log", "log2", "log10", "log1p", "sin", "cos", "tan",
+        "asin", "acos", "atan", "atan2", "sinh", "cosh", "tanh", "floor", "ceil",
+        "gcd", "lcm", "comb", "perm", "hypot", "degrees", "radians", "isqrt", "fsum",
+    )
+    if hasattr(math, name)
+}
+FUNCTIONS.update(
+    abs=abs, round=round, min=min, max=max, sum=sum, len=len, int=int, float=float,
+    pow=_safe_pow, factorial=_safe_factorial, comb=_safe_comb, perm=_safe_perm,
+    Decimal=Decimal, Fraction=Fraction,
+)
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+# Decimal mode keeps transcendental results at full context precision
+DECIMAL_FUNCTIONS = {
+    "sqrt": lambda x: Decimal(x).sqrt(),
+    "exp": lambda x: Decimal(x).exp(),
+    "log": lambda x, base=None: Decimal(x).ln() if base is None else Decimal(x).ln() / Decimal(base).ln(),
+    "log10": lambda x: Decimal(x).log10(),
+}
+
+# math.<name> / np.<name> attribute access is limited to these
+MATH_ATTRS = set(FUNCTIONS) & set(dir(math)) | set(CONSTANTS)
+# `math` as seen by expressions: the same guarded callables as the bare names
+MATH_NAMESPACE = SimpleNamespace(**{name: FUNCTIONS.get(name, CONSTANTS.get(name)) for name in MATH_ATTRS})
+NUMPY_ATTRS = {
+    "sqrt", "exp", "log", "log2", "log10", "sin", "cos", "tan", "sum", "prod", "mean",
+    "median", "std", "min", "max", "abs", "cumsum", "logaddexp", "array", "dot",
+    "round", "pi", "e",
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Call, ast.Attribute, ast.List, ast.Tuple, ast.Compare, ast.BoolOp, ast.IfExp,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.And, ast.Or, ast.Not,
+    ast.keyword,
+)
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Route `**`/`*` through size guards and (in decimal mode) float literals through Decimal."""
+
+    def __init__(self, decimal_mode: bool):
+        self.decimal_mode = decimal_mode
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        guard = {ast.Pow: "__pow__", ast.Mult: "__mul__"}.get(type(node.op))
+        if guard:
+            return ast.copy_location(
+                ast.Call(func=ast.Name(guard, ast.Load()), args=[node.left, node.right], keywords=[]),
+                node,
+            )
+        return node
+
+    def visit_Constant(self, node):
+        if self.decimal_mode and isinstance(node.value, float):
+            return ast.copy_location(
+                ast.Call(func=ast.Name("Decimal", ast.Load()), args=[ast.Constant(repr(node.value))], keywords=[]),
+                node,
+            )
+        return node
+
+
+def _validate(tree: ast.AST, variables: frozenset) -> None:
+    # String literals are only meaningful as exact Decimal("0.1") / Fraction("1/3") arguments
+    numeric_strings = {
+        id(arg)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("Decimal", "Fraction")
+        for arg in node.args
+    }
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"Disallowed syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not (
+            isinstance(node.value, (int, float, complex))
+            or (isinstance(node.value, str) and id(node) in numeric_strings)
+        ):
+            raise ValueError(f"Disallowed constant: {node.value!r}")
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS \
+                and node.id not in variables and node.id not in ("math", "np"):
+            raise ValueError(f"Unknown name: {node.id}")
+        if isinstance(node, ast.Attribute):
+            owner = node.value.id if isinstance(node.value, ast.Name) else None
+            allowed = MATH_ATTRS if owner == "math" else NUMPY_ATTRS if owner == "np" and np is not None else set()
+            if node.attr not in allowed:
+                raise ValueError(f"Disallowed attribute: {ast.unparse(node)}")
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str, variables: frozenset = frozenset(), decimal_mode: bool = False):
+    """Parse, whitelist-check and compile an expression; results are cached per signature."""
+    tree = ast.parse(expression.strip(), mode="eval")
+    _validate(tree, variables)
+    tree = ast.fix_missing_locations(_Rewriter(decimal_mode).visit(tree))
+    return compile(tree, "<expression>", "eval")
+
+
+def evaluate(
+    expression: str,
+    variables: Optional[Dict[str, Any]] = None,
+    decimal_mode: bool = False,
+    precision: int = 50,
+) -> Any:
+    variables = variables or {}
+    for name in variables:
+        if not name.isidentifier() or name.startswith("_"):
+            raise ValueError(f"Invalid variable name: {name}")
+    code = compile_expression(expression, frozenset(variables), decimal_mode)
+    namespace = {
+        "__builtins__": {},
+        "__pow__": _safe_pow,
+        "__mul__": _safe_mul,
+        "math": MATH_NAMESPACE,
+        **FUNCTIONS,
+        **(DECIMAL_FUNCTIONS if decimal_mode else {}),
+        **CONSTANTS,
+        **variables,
+    }
+    if np is not None:
+        namespace["np"] = np
+
+    with localcontext() as ctx:
+        ctx.prec = precision
+        if decimal_mode:
+            namespace.update({k: Decimal(str(v)) for k, v in variables.items() if isinstance(v, float)})
+        result = eval(code, namespace)
+
+    if np is not None and isinstance(result, np.generic):
+        result = result.item()
+    elif np is not None and isinstance(result, np.ndarray):
+        result = result.tolist()
+    return result
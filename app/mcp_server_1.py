@@ -13,13 +13,22 @@ from pathlib import Path
 import requests
 from markitdown import MarkItDown
 import time
-from models import AddInput, AddOutput, SqrtInput, SqrtOutput, StringsToIntsInput, StringsToIntsOutput, ExpSumInput, ExpSumOutput, ShellCommandInput
+from functools import lru_cache
+from models import AddInput, AddOutput, SqrtInput, SqrtOutput, StringsToIntsInput, StringsToIntsOutput, ExpSumInput, ExpSumOutput, ShellCommandInput, SqlQueryInput, ArrayBinaryInput, ArrayUnaryInput, ArrayReduceInput, ArrayOutput, ReduceOutput, ExpressionInput, ExpressionOutput
 from PIL import Image as PILImage
 from tqdm import tqdm
 import hashlib
 from pydantic import BaseModel
 import subprocess
 import sqlite3
+import asyncio
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from sandbox import SandboxPool
+from sql_engine import ReadOnlySQLite
+from evaluator import MAX_FACTORIAL, evaluate
+from modules.tracing import span, trace_server_tools
 
 
 class PythonCodeInput(BaseModel):
@@ -31,6 +40,58 @@ class PythonCodeOutput(BaseModel):
 
 
 mcp = FastMCP("Calculator")
+trace_server_tools(mcp, service="math")
+
+# Big-integer limits: exact results up to MAX_EXACT_DIGITS digits, otherwise
+# an approximation (digit count + leading digits) so payloads stay small.
+# Factorials are exact up to evaluator.MAX_FACTORIAL, the limit evaluate_expression enforces.
+MAX_EXACT_DIGITS = 1000
+MAX_FIBONACCI_N = 1_000_000    # exact Fibonacci computed only below this
+FIBONACCI_PAGE_SIZE = 1000     # values returned per fibonacci_numbers call
+BIGINT_TIME_LIMIT = 2.0        # seconds per computation
+LOG10_PHI = math.log10((1 + math.sqrt(5)) / 2)
+
+
+def approximate_from_log10(log10_value: float) -> str:
+    digits = math.floor(log10_value) + 1
+    mantissa = 10 ** (log10_value - math.floor(log10_value))
+    return f"≈ {mantissa:.10f}e+{digits - 1} ({digits} digits)"
+
+
+def bounded_int(value: int):
+    """Return `value` if it is small enough to send, else its approximation."""
+    if value.bit_length() * 0.30103 <= MAX_EXACT_DIGITS:
+        return value
+    return approximate_from_log10(math.log10(value))
+
+
+@lru_cache(maxsize=256)
+def fibonacci_pair(n: int) -> tuple[int, int]:
+    """(F(n), F(n+1)) by fast doubling: O(log n) big-int multiplications."""
+    deadline = time.monotonic() + BIGINT_TIME_LIMIT
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"fibonacci({n}) exceeded {BIGINT_TIME_LIMIT}s")
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        a, b = (d, c + d) if bit == "1" else (c, d)
+    return a, b
+
+
+def bounded_fibonacci(n: int):
+    if n >= MAX_FIBONACCI_N:
+        # Binet: F(n) ≈ phi^n / sqrt(5)
+        return approximate_from_log10(n * LOG10_PHI - math.log10(math.sqrt(5)))
+    return bounded_int(fibonacci_pair(n)[0])
+
+
+def bounded_factorial(n: int):
+    if n < 0:
+        raise ValueError("factorial() not defined for negative values")
+    if n > MAX_FACTORIAL:
+        return approximate_from_log10(math.lgamma(n + 1) / math.log(10))
+    return bounded_int(math.factorial(n))
 
 
 @mcp.tool()
@@ -83,10 +144,10 @@ def cbrt(a: int) -> float:
 
 # factorial tool
 @mcp.tool()
-def factorial(a: int) -> int:
-    """Compute the factorial of a number. Usage: factorial|a=5"""
+def factorial(a: int) -> int | str:
+    """Compute the factorial of a number (very large results are approximated). Usage: factorial|a=5"""
     print("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+    return bounded_factorial(a)
 
 # log tool
 # @mcp.tool()
@@ -130,13 +191,50 @@ def mine(a: int, b: int) -> int:
     print("CALLED: mine(a: int, b: int) -> int:")
     return int(a - b - b)
 
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_FORMATS = {"png": "PNG", "webp": "WEBP"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+
+@lru_cache(maxsize=256)
+def _render_thumbnail(path: str, mtime_ns: int, file_size: int, fmt: str) -> bytes:
+    # mtime_ns/file_size are part of the cache key so edited files are re-rendered
+    with PILImage.open(path) as img:
+        img.draft("RGB", THUMBNAIL_SIZE)  # JPEG: decode at reduced scale (no-op for other formats)
+        img.thumbnail(THUMBNAIL_SIZE)
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        buffer = BytesIO()
+        img.save(buffer, format=THUMBNAIL_FORMATS[fmt], optimize=True)
+        return buffer.getvalue()
+
+
+def _thumbnail(image_path: str, fmt: str) -> Image:
+    fmt = fmt.lower()
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unsupported thumbnail format: {fmt}")
+    path = Path(image_path).resolve()
+    stat = path.stat()
+    return Image(data=_render_thumbnail(str(path), stat.st_mtime_ns, stat.st_size, fmt), format=fmt)
+
+
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
-    """Create a 100x100 thumbnail from image. Usage: create_thumbnail|image_path="example.jpg\""""
+def create_thumbnail(image_path: str, format: str = "png") -> Image:
+    """Create a 100x100 thumbnail from image (png or webp). Usage: create_thumbnail|image_path="example.jpg\""""
     print("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+    return _thumbnail(image_path, format)
+
+
+@mcp.tool()
+def create_thumbnails(directory: str, format: str = "png", max_images: int = 20) -> list[Image]:
+    """Create 100x100 thumbnails for the images in a directory. Usage: create_thumbnails|directory="documents/images"|max_images=10"""
+    print("CALLED: create_thumbnails(directory: str) -> list[Image]:")
+    paths = sorted(
+        p for p in Path(directory).iterdir()
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )[:max_images]
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        return list(pool.map(lambda p: _thumbnail(str(p), format), paths))
 
 @mcp.tool()
 def strings_to_chars_to_int(input: StringsToIntsInput) -> StringsToIntsOutput:
@@ -153,46 +251,179 @@ def int_list_to_exponential_sum(input: ExpSumInput) -> ExpSumOutput:
     return ExpSumOutput(result=result)
 
 @mcp.tool()
-def fibonacci_numbers(n: int) -> list:
-    """Generate first n Fibonacci numbers. Usage: fibonacci_numbers|n=10"""
+def int_list_to_log_exponential_sum(input: ExpSumInput) -> ExpSumOutput:
+    """Natural log of the sum of exponentials of an int list (log-sum-exp, never overflows). Usage: int_list_to_log_exponential_sum|input={"numbers": [730, 740, 750]}"""
+    print("CALLED: int_list_to_log_exponential_sum(ExpSumInput) -> ExpSumOutput")
+    values = np.asarray(input.int_list, dtype=np.float64)
+    if values.size == 0:
+        return ExpSumOutput(result=float("-inf"))
+    return ExpSumOutput(result=float(np.logaddexp.reduce(values)))
+
+# Array tools: one call for a whole list instead of one call per element
+
+ARRAY_BINARY_OPS = {
+    "add": np.add,
+    "subtract": np.subtract,
+    "multiply": np.multiply,
+    "divide": np.true_divide,
+    "power": np.power,
+    "remainder": np.remainder,
+}
+
+
+def _bounded_power(base: int, exponent: int):
+    """base ** exponent for Python ints, approximated when the exact result would be too long."""
+    if exponent < 0 or abs(base) <= 1:
+        return base ** exponent
+    log10_value = exponent * math.log10(abs(base))
+    if log10_value > MAX_EXACT_DIGITS:
+        approximation = approximate_from_log10(log10_value)
+        return approximation.replace("≈ ", "≈ -", 1) if base < 0 and exponent % 2 else approximation
+    return base ** exponent
+
+ARRAY_UNARY_FUNCS = {
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "sqrt": np.sqrt,
+    "cbrt": np.cbrt,
+    "exp": np.exp,
+    "log": np.log,
+}
+
+ARRAY_REDUCE_OPS = {
+    "sum": np.sum,
+    "prod": np.prod,
+    "mean": np.mean,
+    "min": np.min,
+    "max": np.max,
+    "std": np.std,
+}
+
+
+def _as_array(values) -> np.ndarray:
+    # Python-int object arrays keep exact big-int results for integer inputs
+    if all(isinstance(v, int) for v in np.atleast_1d(values).tolist()):
+        return np.asarray(values, dtype=object)
+    return np.asarray(values, dtype=np.float64)
+
+
+@mcp.tool()
+def array_elementwise(input: ArrayBinaryInput) -> ArrayOutput:
+    """Elementwise add/subtract/multiply/divide/power/remainder over lists (b may be a list or a single number). Usage: array_elementwise|input={"op": "multiply", "a": [1, 2, 3], "b": 10}"""
+    print("CALLED: array_elementwise(ArrayBinaryInput) -> ArrayOutput")
+    a, b = _as_array(input.a), _as_array(input.b)
+    if input.op == "remainder" and np.any(b == 0):
+        raise ValueError("remainder by zero")
+    if input.op == "power" and a.dtype == object and b.dtype == object:
+        return ArrayOutput(result=np.frompyfunc(_bounded_power, 2, 1)(a, b).tolist())
+    if input.op == "divide":
+        a, b = a.astype(np.float64), b.astype(np.float64)
+    return ArrayOutput(result=ARRAY_BINARY_OPS[input.op](a, b).tolist())
+
+
+@mcp.tool()
+def array_unary(input: ArrayUnaryInput) -> ArrayOutput:
+    """Apply sin/cos/tan/sqrt/cbrt/exp/log/factorial to every element of a list. Usage: array_unary|input={"func": "sqrt", "values": [4, 9, 16]}"""
+    print("CALLED: array_unary(ArrayUnaryInput) -> ArrayOutput")
+    if input.func == "factorial":
+        return ArrayOutput(result=[bounded_factorial(int(v)) for v in input.values])
+    values = np.asarray(input.values, dtype=np.float64)
+    return ArrayOutput(result=ARRAY_UNARY_FUNCS[input.func](values).tolist())
+
+
+@mcp.tool()
+def array_reduce(input: ArrayReduceInput) -> ReduceOutput:
+    """Reduce a list with sum/prod/mean/min/max/std. Usage: array_reduce|input={"op": "sum", "values": [1, 2, 3]}"""
+    print("CALLED: array_reduce(ArrayReduceInput) -> ReduceOutput")
+    values = _as_array(input.values)
+    if input.op in ("mean", "std"):
+        values = values.astype(np.float64)
+    result = ARRAY_REDUCE_OPS[input.op](values)
+    return ReduceOutput(result=result.item() if hasattr(result, "item") else result)
+
+@mcp.tool()
+async def evaluate_expression(input: ExpressionInput) -> ExpressionOutput:
+    """Evaluate a whole arithmetic expression in one call (math functions, np.*, big ints; decimal=true for exact decimals). Usage: evaluate_expression|input={"expression": "log(1250000) + sqrt(x) * 2**10", "variables": {"x": 49}}"""
+    print("CALLED: evaluate_expression(ExpressionInput) -> ExpressionOutput")
+    if not EXPRESSION_IN_SANDBOX:
+        # The whitelist and the evaluator's pow/mul/factorial/comb guards keep this fast
+        try:
+            result = evaluate(input.expression, input.variables, decimal_mode=input.decimal, precision=input.precision)
+            return ExpressionOutput(result=str(result))
+        except Exception as e:
+            return ExpressionOutput(result=f"ERROR: {e}")
+    # Inputs are plain str/int/float/bool values, so their reprs are safe to embed
+    code = (
+        "from evaluator import evaluate\n"
+        f"result = evaluate({input.expression!r}, {dict(input.variables)!r}, "
+        f"decimal_mode={input.decimal!r}, precision={input.precision!r})"
+    )
+    result = await asyncio.to_thread(get_sandbox_pool().run, code, EXPRESSION_CPU_SECONDS)
+    return ExpressionOutput(result=result)
+
+@mcp.tool()
+def fibonacci(n: int) -> int | str:
+    """Compute the nth Fibonacci number, F(0)=0 (very large results are approximated). Usage: fibonacci|n=100"""
+    print("CALLED: fibonacci(n: int) -> int:")
+    if n < 0:
+        return "ERROR: n must be non-negative"
+    return bounded_fibonacci(n)
+
+@mcp.tool()
+def fibonacci_numbers(n: int, start: int = 0) -> list:
+    """Generate n Fibonacci numbers from index start (at most 1000 per call; page with start). Usage: fibonacci_numbers|n=10"""
     print("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
+    count = min(n, FIBONACCI_PAGE_SIZE)
+    if count <= 0 or start < 0:
         return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+    if start + count > MAX_FIBONACCI_N:
+        return [bounded_fibonacci(i) for i in range(start, start + count)]
+    a, b = fibonacci_pair(start)
+    fib_sequence = []
+    for _ in range(count):
+        fib_sequence.append(bounded_int(a))
+        a, b = b, a + b
+    return fib_sequence
 
 # New Tools
 from io import StringIO
 import sys
 import math
 
-@mcp.tool()
-def run_python_sandbox(input: PythonCodeInput) -> PythonCodeOutput:
-    """Run math code in Python sandbox. Usage: run_python_sandbox|input={"code": "result = math.sqrt(49)"}"""
-    import sys, io
-    import math
-
-    allowed_globals = {
-        "__builtins__": __builtins__  # Allow imports like in executor.py
-    }
+# Sandbox pool: created on first use; its workers start on demand and stay warm while this server runs
+SANDBOX_WORKERS = 2
+SANDBOX_CPU_SECONDS = 5
+SANDBOX_MEMORY_MB = 512  # on top of what a warm worker already maps
+SANDBOX_MAX_RUNS = 50  # recycle a worker after this many executions
+# Opt-in backstop: evaluate expressions in a sandbox worker under a CPU limit, at the cost of
+# a worker start on the first call of each server process
+EXPRESSION_IN_SANDBOX = os.getenv("EXPRESSION_SANDBOX", "0") == "1"
+EXPRESSION_CPU_SECONDS = 2  # per sandboxed evaluate_expression call
+
+_sandbox_pool = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    global _sandbox_pool
+    with _sandbox_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = SandboxPool(
+                size=SANDBOX_WORKERS,
+                cpu_seconds=SANDBOX_CPU_SECONDS,
+                memory_mb=SANDBOX_MEMORY_MB,
+                max_runs=SANDBOX_MAX_RUNS,
+            )
+        return _sandbox_pool
 
-    local_vars = {}
 
-    # Capture print output
-    stdout_backup = sys.stdout
-    output_buffer = io.StringIO()
-    sys.stdout = output_buffer
-
-    try:
-        exec(input.code, allowed_globals, local_vars)
-        sys.stdout = stdout_backup
-        result = local_vars.get("result", output_buffer.getvalue().strip() or "Executed.")
-        return PythonCodeOutput(result=str(result))
-    except Exception as e:
-        sys.stdout = stdout_backup
-        return PythonCodeOutput(result=f"ERROR: {e}")
+@mcp.tool()
+async def run_python_sandbox(input: PythonCodeInput) -> PythonCodeOutput:
+    """Run math code in Python sandbox. Usage: run_python_sandbox|input={"code": "result = math.sqrt(49)"}"""
+    pool = get_sandbox_pool()
+    result = await asyncio.to_thread(pool.run, input.code)
+    return PythonCodeOutput(result=result)
 
 
 
@@ -222,18 +453,28 @@ def run_shell_command(input: ShellCommandInput) -> PythonCodeOutput:
         return PythonCodeOutput(result=f"ERROR: {e}")
 
 
+SQL_DB_PATH = "example.db"
+_sql_engine = None
+_sql_lock = threading.Lock()
+
+
+def get_sql_engine() -> ReadOnlySQLite:
+    global _sql_engine
+    with _sql_lock:
+        if _sql_engine is None:
+            _sql_engine = ReadOnlySQLite(SQL_DB_PATH)
+        return _sql_engine
+
+
 @mcp.tool()
-def run_sql_query(input: PythonCodeInput) -> PythonCodeOutput:
-    """Run safe SELECT-only SQL query. Usage: run_sql_query|input={"code": "SELECT * FROM users LIMIT 5"}"""
-    if not input.code.strip().lower().startswith("select"):
+async def run_sql_query(input: SqlQueryInput) -> PythonCodeOutput:
+    """Run safe SELECT-only SQL query (read-only, row-capped; format "json" returns columns). Usage: run_sql_query|input={"code": "SELECT * FROM users LIMIT 5"}"""
+    if not input.code.strip().lower().startswith(("select", "with")):
         return PythonCodeOutput(result="Only SELECT queries allowed.")
 
     try:
-        conn = sqlite3.connect("example.db")
-        cursor = conn.cursor()
-        cursor.execute(input.code)
-        rows = cursor.fetchall()
-        result = "\n".join(str(row) for row in rows)
+        engine = get_sql_engine()
+        result = await asyncio.to_thread(engine.execute, input.code, input.max_rows, input.format)
         return PythonCodeOutput(result=result or "No results.")
     except Exception as e:
         return PythonCodeOutput(result=f"ERROR: {e}")
@@ -241,6 +482,30 @@ def run_sql_query(input: PythonCodeInput) -> PythonCodeOutput:
 
 # DEFINE RESOURCES
 
+# Result-cache policy read by MultiMCP: ttl in seconds (None = never expires);
+# file_arg names the argument whose file's mtime/size must match for a hit.
+CACHE_POLICY = {
+    "epoch": "1",
+    "tools": {
+        **{name: {"ttl": None} for name in (
+            "add", "sqrt", "subtract", "multiply", "divide", "power", "cbrt", "factorial",
+            "remainder", "sin", "cos", "tan", "mine", "strings_to_chars_to_int",
+            "int_list_to_exponential_sum", "int_list_to_log_exponential_sum",
+            "array_elementwise", "array_unary", "array_reduce", "evaluate_expression",
+            "fibonacci", "fibonacci_numbers",
+        )},
+        "create_thumbnail": {"ttl": None, "file_arg": "image_path"},
+        "run_sql_query": {"ttl": 60},
+    },
+}
+
+
+@mcp.resource("cache://tools")
+def cache_policy() -> str:
+    """Which tools' results may be cached by the client, and for how long"""
+    return json.dumps(CACHE_POLICY)
+
+
 # Add a dynamic greeting resource
 @mcp.resource("greeting://{name}")
 def get_greeting(name: str) -> str:
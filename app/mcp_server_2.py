@@ -10,8 +10,6 @@ import json
 import faiss
 import numpy as np
 from pathlib import Path
-import requests
-from markitdown import MarkItDown
 import time
 from models import AddInput, AddOutput, SqrtInput, SqrtOutput, StringsToIntsInput, StringsToIntsOutput, ExpSumInput, ExpSumOutput, PythonCodeInput, PythonCodeOutput, UrlInput, FilePathInput, MarkdownInput, MarkdownOutput, ChunkListOutput
 from tqdm import tqdm
@@ -22,14 +20,23 @@ import sqlite3
 import trafilatura
 import pymupdf4llm
 import re
+import mmap
+import threading
+from contextlib import contextmanager
+from typing import Iterator
 import base64 # ollama needs base64-encoded-image
+from modules.tracing import span, trace_server_tools
+from modules.http_client import EMBED_TIMEOUT_S, model_client
+from modules.markdown_pool import CONVERT_WORKERS, ConversionStats, convert_all
 
 
 mcp = FastMCP("Calculator")
+trace_server_tools(mcp, service="documents")
 
-EMBED_URL = "http://localhost:11434/api/embeddings"
-OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+EMBED_URL = f"{OLLAMA_BASE_URL}/api/embeddings"
+OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
 EMBED_MODEL = "nomic-embed-text"
 GEMMA_MODEL = "gemma3:12b"
 PHI_MODEL = "phi4:latest"
@@ -38,12 +45,18 @@ CHUNK_OVERLAP = 40
 MAX_CHUNK_LENGTH = 512  # characters
 TOP_K = 3  # FAISS top-K matches
 ROOT = Path(__file__).parent.resolve()
+INDEX_DIR = Path(os.getenv("DOCUMENT_INDEX_DIR", ROOT / "faiss_index"))
+INDEX_FILE = INDEX_DIR / "index.bin"
+METADATA_FILE = INDEX_DIR / "metadata.json"
+# One metadata record per JSON line, then the uint64 byte offset of each line (+ end) and
+# the record count, in a single file so one os.replace swaps records and offsets together
+CHUNK_STORE_FILE = INDEX_DIR / "chunks.bin"
 
 
 def get_embedding(text: str) -> np.ndarray:
-    response = requests.post(EMBED_URL, json={"model": EMBED_MODEL, "prompt": text})
-    response.raise_for_status()
-    return np.array(response.json()["embedding"], dtype=np.float32)
+    # Idempotent, so a request slower than the endpoint's p95 is hedged with a second copy
+    response = model_client.post_json(EMBED_URL, {"model": EMBED_MODEL, "prompt": text}, timeout=EMBED_TIMEOUT_S, hedge=True)
+    return np.array(response["embedding"], dtype=np.float32)
 
 def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     words = text.split()
@@ -83,37 +96,168 @@ Just respond in one word (Yes or No), and do not provide any further explanation
     print(f"  Chunk {index} → {chunk1[:60]}{'...' if len(chunk1) > 60 else ''}")
     print(f"  Chunk {index+1} → {chunk2[:60]}{'...' if len(chunk2) > 60 else ''}")
 
-    response = requests.post(OLLAMA_CHAT_URL, json={
+    response = model_client.post_json(OLLAMA_CHAT_URL, {
         "model": PHI_MODEL,
         "messages": [{"role": "user", "content": prompt}],
         "stream": False
     })
-    response.raise_for_status()
-    reply = response.json().get("message", {}).get("content", "").strip().lower()
+    reply = response.get("message", {}).get("content", "").strip().lower()
     print(f"  ✅ Model reply: {reply}")
     return reply.startswith("yes")
 
 
 
+# === INDEX LOADING ===
+# The index and chunk store are memory-mapped read-only so warm server
+# processes share page-cache pages instead of each holding a heap copy.
+
+# Held while the index files are rewritten, so a search never migrates a half-written set
+_index_write_lock = threading.RLock()
+
+
+def tmp_path(target: Path) -> Path:
+    """A scratch file next to `target`, unique per process and thread."""
+    return target.with_name(f"{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp{target.suffix}")
+
+
+def write_chunk_store(metadata: list[dict]) -> None:
+    """Write metadata as JSONL plus a line-offset table that can be mmapped, replacing the store atomically."""
+    offsets = [0]
+    tmp_store = tmp_path(CHUNK_STORE_FILE)
+    with _index_write_lock:
+        with open(tmp_store, "wb") as f:
+            for record in metadata:
+                line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+            f.write(np.asarray(offsets + [len(metadata)], dtype=np.uint64).tobytes())
+        os.replace(tmp_store, CHUNK_STORE_FILE)
+
+
+class DocumentStore:
+    """Read-only, memory-mapped view of the FAISS index and its chunk metadata."""
+
+    def __init__(self):
+        if self._stale():
+            # Waits for an in-progress save, after which the store is usually current again
+            with _index_write_lock:
+                if self._stale():
+                    # One-off migration from (or refresh after) a metadata.json-only index
+                    write_chunk_store(json.loads(METADATA_FILE.read_text()))
+
+        self.version = self.current_version()
+        self.searches = 0  # in-flight searches, guarded by _store_lock
+        self.retired = False
+        self.index = self._read_index()
+        self._store_file = open(CHUNK_STORE_FILE, "rb")
+        self._store = mmap.mmap(self._store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._store) - 8
+        count = int(np.frombuffer(self._store, dtype=np.uint64, count=1, offset=end)[0])
+        self.offsets = np.frombuffer(self._store, dtype=np.uint64, count=count + 1, offset=end - 8 * (count + 1))
+
+    @staticmethod
+    def _stale() -> bool:
+        return not CHUNK_STORE_FILE.exists() or CHUNK_STORE_FILE.stat().st_mtime < METADATA_FILE.stat().st_mtime
+
+    @staticmethod
+    def current_version() -> tuple:
+        return tuple(
+            (p.stat().st_mtime_ns, p.stat().st_size)
+            for p in (INDEX_FILE, METADATA_FILE)
+        )
+
+    @staticmethod
+    def _read_index():
+        flags = faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(str(INDEX_FILE), flags)
+        except RuntimeError as e:
+            # Older FAISS builds can only mmap IVF inverted lists, not flat codes
+            mcp_log("WARN", f"mmap index load unavailable ({e}); reading into memory")
+            return faiss.read_index(str(INDEX_FILE))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def record(self, idx: int) -> dict:
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return json.loads(self._store[start:end])
+
+    def close(self) -> None:
+        """Unmap the index and chunk store; the files may already have been replaced on disk."""
+        self.index = None  # freeing the FAISS index releases its mapping
+        self.offsets = None  # a view of the mapping; must go before it is closed
+        self._store.close()
+        self._store_file.close()
+
+
+_store: DocumentStore | None = None
+_store_lock = threading.Lock()
+
+
+@contextmanager
+def document_store() -> Iterator[DocumentStore]:
+    """
+    The shared store for one search, reopened only when the index files change. A
+    replaced store is closed as soon as the last search using it finishes.
+    """
+    global _store
+    with span("faiss.open"), _store_lock:
+        if _store is None or _store.version != DocumentStore.current_version():
+            previous, _store = _store, DocumentStore()
+            if previous is not None:
+                previous.retired = True
+                if not previous.searches:
+                    previous.close()
+        store = _store
+        store.searches += 1
+    try:
+        yield store
+    finally:
+        with _store_lock:
+            store.searches -= 1
+            if store.retired and not store.searches:
+                store.close()
+
+
 @mcp.tool()
 def search_documents(query: str) -> list[str]:
     """Search indexed documents for relevant content. Usage: search_documents|query="india Current GDP" """
     ensure_faiss_ready()
     mcp_log("SEARCH", f"Query: {query}")
     try:
-        index = faiss.read_index(str(ROOT / "faiss_index" / "index.bin"))
-        metadata = json.loads((ROOT / "faiss_index" / "metadata.json").read_text())
-        query_vec = get_embedding(query).reshape(1, -1)
-        D, I = index.search(query_vec, k=5)
-        results = []
-        for idx in I[0]:
-            data = metadata[idx]
-            results.append(f"{data['chunk']}\n[Source: {data['doc']}, ID: {data['chunk_id']}]")
+        with document_store() as store:
+            with span("embed", model=EMBED_MODEL):
+                query_vec = get_embedding(query).reshape(1, -1)
+            with span("faiss.search", vectors=store.index.ntotal):
+                D, I = store.index.search(query_vec, k=5)
+            results = []
+            for idx in I[0]:
+                if idx < 0 or idx >= len(store):
+                    continue
+                data = store.record(idx)
+                results.append(f"{data['chunk']}\n[Source: {data['doc']}, ID: {data['chunk_id']}]")
         return results
     except Exception as e:
         return [f"ERROR: Failed to search: {str(e)}"]
 
 
+@mcp.resource("cache://tools")
+def cache_policy() -> str:
+    """Which tools' results may be cached by the client, and for how long"""
+    # The epoch changes whenever the index is rebuilt, invalidating cached searches
+    epoch = str(DocumentStore.current_version()) if INDEX_FILE.exists() and METADATA_FILE.exists() else "empty"
+    return json.dumps({
+        "epoch": epoch,
+        "tools": {
+            # The epoch is only read when the client starts; the index files' stamps catch later rebuilds
+            "search_documents": {"ttl": 3600, "depends_on": [str(INDEX_FILE), str(METADATA_FILE)]},
+            "extract_pdf": {"ttl": None, "file_arg": "input.file_path"},
+            "extract_webpage": {"ttl": 600},
+        },
+    })
+
+
 def caption_image(img_url_or_path: str) -> str:
     mcp_log("CAPTION", f"🖼️ Attempting to caption image: {img_url_or_path}")
 
@@ -126,22 +270,21 @@ def caption_image(img_url_or_path: str) -> str:
 
     try:
         if img_url_or_path.startswith("http"): # for extract_web_pages
-            response = requests.get(img_url_or_path)
-            encoded_image = base64.b64encode(response.content).decode("utf-8")
+            encoded_image = base64.b64encode(model_client.get_bytes(img_url_or_path)).decode("utf-8")
         else:
             with open(full_path, "rb") as img_file:
                 encoded_image = base64.b64encode(img_file.read()).decode("utf-8")
 
         # Set stream=True to get the full generator-style output
-        with requests.post(OLLAMA_URL, json={
+        with model_client.stream_lines(OLLAMA_URL, {
             "model": GEMMA_MODEL,
             "prompt": "If there is lot of text in the image, then ONLY reply back with exact text in the image, else Describe the image such that your response can replace 'alt-text' for it. Only explain the contents of the image and provide no further explaination.",
             "images": [encoded_image],
             "stream": True
-        }, stream=True) as response:
+        }) as lines:
 
             caption_parts = []
-            for line in response.iter_lines():
+            for line in lines:
                 if not line:
                     continue
                 try:
@@ -260,12 +403,12 @@ Keep markdown formatting intact.
 """
 
         try:
-            response = requests.post(OLLAMA_CHAT_URL, json={
+            response = model_client.post_json(OLLAMA_CHAT_URL, {
                 "model": PHI_MODEL,
                 "messages": [{"role": "user", "content": prompt}],
                 "stream": False
             })
-            reply = response.json().get("message", {}).get("content", "").strip()
+            reply = response.get("message", {}).get("content", "").strip()
 
             if reply:
                 # If LLM returned second part, separate it
@@ -306,8 +449,8 @@ def process_documents():
     mcp_log("INFO", "Indexing documents with unified RAG pipeline...")
     ROOT = Path(__file__).parent.resolve()
     DOC_PATH = ROOT / "documents"
-    INDEX_CACHE = ROOT / "faiss_index"
-    INDEX_CACHE.mkdir(exist_ok=True)
+    INDEX_CACHE = INDEX_DIR
+    INDEX_CACHE.mkdir(parents=True, exist_ok=True)
     INDEX_FILE = INDEX_CACHE / "index.bin"
     METADATA_FILE = INDEX_CACHE / "metadata.json"
     CACHE_FILE = INDEX_CACHE / "doc_index_cache.json"
@@ -318,79 +461,115 @@ def process_documents():
     CACHE_META = json.loads(CACHE_FILE.read_text()) if CACHE_FILE.exists() else {}
     metadata = json.loads(METADATA_FILE.read_text()) if METADATA_FILE.exists() else []
     index = faiss.read_index(str(INDEX_FILE)) if INDEX_FILE.exists() else None
+    stats = ConversionStats()
 
+    def index_markdown(file, fhash, markdown):
+        nonlocal index
+        if not markdown.strip():
+            mcp_log("WARN", f"No content extracted from {file.name}")
+            return
+
+        if len(markdown.split()) < 10:
+            mcp_log("WARN", f"Content too short for semantic merge in {file.name} → Skipping chunking.")
+            chunks = [markdown.strip()]
+        else:
+            mcp_log("INFO", f"Running semantic merge on {file.name} with {len(markdown.split())} words")
+            chunks = semantic_merge(markdown)
+
+
+        embeddings_for_file = []
+        new_metadata = []
+        for i, chunk in enumerate(tqdm(chunks, desc=f"Embedding {file.name}")):
+            embedding = get_embedding(chunk)
+            embeddings_for_file.append(embedding)
+            new_metadata.append({
+                "doc": file.name,
+                "chunk": chunk,
+                "chunk_id": f"{file.stem}_{i}"
+            })
+
+        if embeddings_for_file:
+            if index is None:
+                dim = len(embeddings_for_file[0])
+                index = faiss.IndexFlatL2(dim)
+            index.add(np.stack(embeddings_for_file))
+            metadata.extend(new_metadata)
+            CACHE_META[file.name] = fhash
+
+            # ✅ Immediately save index and metadata
+            with _index_write_lock:
+                CACHE_FILE.write_text(json.dumps(CACHE_META, indent=2))
+                METADATA_FILE.write_text(json.dumps(metadata, indent=2))
+                write_chunk_store(metadata)
+                # Replace atomically: search processes may have the old file mmapped
+                tmp_index = tmp_path(INDEX_FILE)
+                faiss.write_index(index, str(tmp_index))
+                os.replace(tmp_index, INDEX_FILE)
+            mcp_log("SAVE", f"Saved FAISS index and metadata after processing {file.name}")
+
+    pending = {}
     for file in DOC_PATH.glob("*.*"):
         fhash = file_hash(file)
         if file.name in CACHE_META and CACHE_META[file.name] == fhash:
             mcp_log("SKIP", f"Skipping unchanged file: {file.name}")
             continue
-
-        mcp_log("PROC", f"Processing: {file.name}")
+        pending[file] = fhash
+
+    # MarkItDown formats convert in a process pool while PDFs and web pages are handled here
+    pooled = {f for f in pending if f.suffix.lower() not in (".pdf", ".html", ".htm", ".url")}
+    if pooled:
+        mcp_log("INFO", f"Converting {len(pooled)} file(s) with MarkItDown on up to {CONVERT_WORKERS} worker(s)")
+    def index_conversion(conversion):
+        file = conversion.path
+        stats.add(file, conversion.seconds, failed=conversion.error is not None)
+        if conversion.error:
+            mcp_log("ERROR", f"Failed to convert {file.name}: {conversion.error}")
+            return
+        mcp_log("PROC", f"Processing: {file.name} (converted in {conversion.seconds:.2f}s)")
         try:
-            ext = file.suffix.lower()
-            markdown = ""
-
-            if ext == ".pdf":
-                mcp_log("INFO", f"Using MuPDF4LLM to extract {file.name}")
-                markdown = extract_pdf(FilePathInput(file_path=str(file))).markdown
-
-            elif ext in [".html", ".htm", ".url"]:
-                mcp_log("INFO", f"Using Trafilatura to extract {file.name}")
-                markdown = extract_webpage(UrlInput(url=file.read_text().strip())).markdown
-
-            else:
-                # Fallback to MarkItDown for other formats
-                converter = MarkItDown()
-                mcp_log("INFO", f"Using MarkItDown fallback for {file.name}")
-                markdown = converter.convert(str(file)).text_content
+            index_markdown(file, pending[file], conversion.markdown)
+        except Exception as e:
+            mcp_log("ERROR", f"Failed to process {file.name}: {e}")
 
-            if not markdown.strip():
-                mcp_log("WARN", f"No content extracted from {file.name}")
+    wall_start = time.perf_counter()
+    conversions = convert_all(list(pooled))
+    try:
+        for file in pending:
+            if file in pooled:
                 continue
+            mcp_log("PROC", f"Processing: {file.name}")
+            start = time.perf_counter()
+            try:
+                if file.suffix.lower() == ".pdf":
+                    mcp_log("INFO", f"Using MuPDF4LLM to extract {file.name}")
+                    markdown = extract_pdf(FilePathInput(file_path=str(file))).markdown
+                else:
+                    mcp_log("INFO", f"Using Trafilatura to extract {file.name}")
+                    markdown = extract_webpage(UrlInput(url=file.read_text().strip())).markdown
+                stats.add(file, time.perf_counter() - start)
+                index_markdown(file, pending[file], markdown)
+            except Exception as e:
+                mcp_log("ERROR", f"Failed to process {file.name}: {e}")
+            # Index whatever finished converting meanwhile, so results don't pile up in memory
+            for conversion in conversions.ready():
+                index_conversion(conversion)
 
-            if len(markdown.split()) < 10:
-                mcp_log("WARN", f"Content too short for semantic merge in {file.name} → Skipping chunking.")
-                chunks = [markdown.strip()]
-            else:
-                mcp_log("INFO", f"Running semantic merge on {file.name} with {len(markdown.split())} words")
-                chunks = semantic_merge(markdown)
-
-
-            embeddings_for_file = []
-            new_metadata = []
-            for i, chunk in enumerate(tqdm(chunks, desc=f"Embedding {file.name}")):
-                embedding = get_embedding(chunk)
-                embeddings_for_file.append(embedding)
-                new_metadata.append({
-                    "doc": file.name,
-                    "chunk": chunk,
-                    "chunk_id": f"{file.stem}_{i}"
-                })
-
-            if embeddings_for_file:
-                if index is None:
-                    dim = len(embeddings_for_file[0])
-                    index = faiss.IndexFlatL2(dim)
-                index.add(np.stack(embeddings_for_file))
-                metadata.extend(new_metadata)
-                CACHE_META[file.name] = fhash
-
-                # ✅ Immediately save index and metadata
-                CACHE_FILE.write_text(json.dumps(CACHE_META, indent=2))
-                METADATA_FILE.write_text(json.dumps(metadata, indent=2))
-                faiss.write_index(index, str(INDEX_FILE))
-                mcp_log("SAVE", f"Saved FAISS index and metadata after processing {file.name}")
+        for conversion in conversions:
+            index_conversion(conversion)
+    finally:
+        conversions.close()  # the converter processes aren't kept between indexing runs
 
-        except Exception as e:
-            mcp_log("ERROR", f"Failed to process {file.name}: {e}")
+    stats.wall_seconds = time.perf_counter() - wall_start
+    if stats.formats:
+        for line in stats.lines():
+            mcp_log("STATS", line)
+    return stats.report()
 
 
 
 def ensure_faiss_ready():
     from pathlib import Path
-    index_path = ROOT / "faiss_index" / "index.bin"
-    meta_path = ROOT / "faiss_index" / "metadata.json"
-    if not (index_path.exists() and meta_path.exists()):
+    if not (INDEX_FILE.exists() and METADATA_FILE.exists()):
         mcp_log("INFO", "Index not found — running process_documents()...")
         process_documents()
     else:
@@ -2,16 +2,16 @@ from mcp.server.fastmcp import FastMCP, Context
 import httpx
 from bs4 import BeautifulSoup
 from typing import List, Dict, Optional, Any
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import urllib.parse
 import sys
 import traceback
 import asyncio
-from datetime import datetime, timedelta
 import time
 from fake_useragent import UserAgent
 import re
 import os
+import json
 from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -23,6 +23,22 @@ import base64
 from google.auth.transport.requests import Request
 import os.path
 import logging
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from modules.tracing import span, trace_server_tools
+
+# Optional fast HTML backends: selectolax for page text, lxml for BeautifulSoup
+try:
+    from selectolax.parser import HTMLParser as FastHTMLParser
+except ImportError:
+    FastHTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    BS4_PARSER = "lxml"
+except ImportError:
+    BS4_PARSER = "html.parser"
 
 # Create a module-level logger
 logger = logging.getLogger(__name__)
@@ -40,6 +56,34 @@ logging.basicConfig(
 # Ensure the logger uses the configured logging level
 logger.setLevel(logging.INFO)
 
+# MultiMCP starts a fresh server process per tool call, so state that should outlive
+# one call (the search cache, rate-limit buckets) is kept in SQLite rather than in memory
+WEB_STATE_DB = Path(os.getenv("WEB_STATE_DB", Path(__file__).parent / "faiss_index" / "web_state.sqlite3"))
+
+_state_db: Optional[sqlite3.Connection] = None
+
+
+def state_db() -> Optional[sqlite3.Connection]:
+    """This process's connection to WEB_STATE_DB, or None if it can't be opened."""
+    global _state_db
+    if _state_db is None:
+        try:
+            WEB_STATE_DB.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(WEB_STATE_DB, timeout=5.0, isolation_level=None)
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY, stored_at REAL, used_at REAL, results TEXT
+                );
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    host TEXT PRIMARY KEY, tokens REAL, updated REAL
+                );
+            """)
+            _state_db = db
+        except sqlite3.Error as e:
+            logger.warning(f"Shared web state unavailable ({e}); caching and rate limits are per process")
+            return None
+    return _state_db
+
 
 @dataclass
 class SearchResult:
@@ -50,24 +94,135 @@ class SearchResult:
 
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 30):
+    """
+    Token bucket allowing `requests_per_minute` sustained, with bursts up to `burst`.
+    The bucket is a row in WEB_STATE_DB, so every server process draws on the same
+    tokens. A caller reserves its token in one short transaction (which fixes the
+    serving order) and then sleeps off any shortfall without holding a lock.
+    """
+
+    def __init__(self, host: str, requests_per_minute: int = 30, burst: Optional[int] = None):
+        self.host = host
         self.requests_per_minute = requests_per_minute
-        self.requests = []
+        self.rate = requests_per_minute / 60.0  # tokens per second
+        self.capacity = float(burst or requests_per_minute)
+        # Used only when WEB_STATE_DB is unavailable
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+        # Metrics (this process only)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refilled(self, tokens: float, updated: float, now: float) -> float:
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+    def _reserve(self) -> float:
+        """Take one token, possibly going into debt; return how long to wait for it."""
+        now = time.time()
+        db = state_db()
+        if db is not None:
+            try:
+                return max(0.0, -self._reserve_shared(db, now) / self.rate)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared rate limit for {self.host} unavailable ({e}); using this process's bucket")
+        self.tokens = self._refilled(self.tokens, self.updated, now) - 1
+        self.updated = now
+        return max(0.0, -self.tokens / self.rate)
+
+    def _reserve_shared(self, db: sqlite3.Connection, now: float) -> float:
+        db.execute("BEGIN IMMEDIATE")  # serialises reservations across processes
+        try:
+            row = db.execute("SELECT tokens, updated FROM rate_buckets WHERE host = ?", (self.host,)).fetchone()
+            tokens = (self.capacity if row is None else self._refilled(row[0], row[1], now)) - 1
+            db.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (self.host, tokens, now))
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        return tokens
+
+    def available(self) -> float:
+        db = state_db()
+        if db is None:
+            return self._refilled(self.tokens, self.updated, time.time())
+        row = db.execute("SELECT tokens, updated FROM rate_buckets WHERE host = ?", (self.host,)).fetchone()
+        return self.capacity if row is None else self._refilled(row[0], row[1], time.time())
 
     async def acquire(self):
-        now = datetime.now()
-        # Remove requests older than 1 minute
-        self.requests = [
-            req for req in self.requests if now - req < timedelta(minutes=1)
-        ]
+        start = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            delay = self._reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_available": round(self.available(), 2),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "acquired": self.acquired,
+            "avg_wait_s": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+            "max_wait_s": round(self.max_wait, 3),
+        }
+
+
+class HostRateLimiter:
+    """One RateLimiter bucket per upstream host, shared by every server process."""
+
+    def __init__(self, default_rpm: int = 20, host_rpm: Optional[Dict[str, int]] = None):
+        self.default_rpm = default_rpm
+        self.host_rpm = host_rpm or {}
+        self.buckets: Dict[str, RateLimiter] = {}
+
+    def bucket(self, url: str) -> RateLimiter:
+        host = (urllib.parse.urlsplit(url).hostname or "").lower()
+        if host not in self.buckets:
+            self.buckets[host] = RateLimiter(host, self.host_rpm.get(host, self.default_rpm))
+        return self.buckets[host]
+
+    async def acquire(self, url: str) -> float:
+        waited = await self.bucket(url).acquire()
+        if waited > 0.05:
+            logger.info(f"Rate limited {urllib.parse.urlsplit(url).hostname} for {waited:.2f}s")
+        return waited
 
-        if len(self.requests) >= self.requests_per_minute:
-            # Wait until we can make another request
-            wait_time = 60 - (now - self.requests[0]).total_seconds()
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: limiter.stats() for host, limiter in self.buckets.items()}
 
-        self.requests.append(now)
+
+# DuckDuckGo tolerates ~30 rpm before bot detection; other sites get 20 rpm each
+rate_limiter = HostRateLimiter(default_rpm=20, host_rpm={"html.duckduckgo.com": 30})
+
+
+# Shared connection pool for all outbound HTTP from this server
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _http_client
 
 
 class DuckDuckGoSearcher:
@@ -92,8 +247,48 @@ class DuckDuckGoSearcher:
         #"TE": "trailers",
     }
 
-    def __init__(self):
-        self.rate_limiter = RateLimiter()
+    CACHE_TTL = 600  # seconds a parsed result list stays fresh
+    CACHE_MAX_ENTRIES = 256
+
+    def __init__(self, limiter: HostRateLimiter = rate_limiter):
+        self.rate_limiter = limiter
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def cache_key(query: str, max_results: int) -> str:
+        return f"{max_results}:{' '.join(query.lower().split())}"
+
+    def _cache_get(self, key: str) -> Optional[List[SearchResult]]:
+        db = state_db()
+        if db is None:
+            return None
+        now = time.time()
+        row = db.execute("SELECT stored_at, results FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > self.CACHE_TTL:
+            db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            return None
+        db.execute("UPDATE search_cache SET used_at = ? WHERE key = ?", (now, key))
+        return [SearchResult(**r) for r in json.loads(row[1])]
+
+    def _cache_put(self, key: str, results: List[SearchResult]) -> None:
+        db = state_db()
+        if db is None:
+            return
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?)",
+            (key, now, now, json.dumps([asdict(r) for r in results])),
+        )
+        # Least recently used entries go first
+        db.execute(
+            "DELETE FROM search_cache WHERE key NOT IN "
+            "(SELECT key FROM search_cache ORDER BY used_at DESC LIMIT ?)",
+            (self.CACHE_MAX_ENTRIES,),
+        )
 
     def format_results_for_llm(self, results: List[SearchResult]) -> str:
         """Format results in a natural language style that's easier for LLMs to process"""
@@ -115,33 +310,53 @@ class DuckDuckGoSearcher:
     async def search(
         self, query: str, ctx: Context = None, max_results: int = 10
     ) -> List[SearchResult]:
-        # Create list of SearchResult with static data
         # Extensive type and value checking with detailed tracing
         logger.debug(f"Search method called with: query={query}, type={type(query)}, ctx={ctx}, max_results={max_results}")
         if not isinstance(query, str):
             logger.warning(f"Non-string query detected. Attempting conversion. Original type: {type(query)}")
             query = str(query)
-        # Attempt to convert query to string
-        try:
-            # If query is not a string, attempt conversion
-            if not isinstance(query, str):
-                logger.warning(f"Non-string query detected. Attempting conversion. Original type: {type(query)}")
-                query = str(query)
-        
-        
-            if not query or len(query.strip()) == 0:
-                logger.error(f"Invalid search query: {query}")
-                return []
 
+        if not query or len(query.strip()) == 0:
+            logger.error(f"Invalid search query: {query}")
+            return []
+
+        key = self.cache_key(query, max_results)
+        try:
+            cached = self._cache_get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            self.cache_hits += 1
+            logger.info(f"Search cache hit for: {query}")
+            return cached
+        self.cache_misses += 1
+
+        # Single-flight: concurrent identical queries in this process share one upstream
+        # request. Separate tool calls run in separate processes and share only the cache.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._search_uncached(query, max_results))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            logger.info(f"Joining in-flight search for: {query}")
+
+        results = await asyncio.shield(task)
+        # Empty lists are usually bot detection or transient errors; retry next time
+        if results:
+            try:
+                self._cache_put(key, results)
+            except sqlite3.Error as e:
+                logger.warning(f"Search cache write failed: {e}")
+        return list(results)
+
+    async def _search_uncached(self, query: str, max_results: int) -> List[SearchResult]:
+        try:
             # Apply rate limiting
-            await self.rate_limiter.acquire()
+            with span("rate_limit.wait"):
+                await self.rate_limiter.acquire(self.BASE_URL)
 
-            # Create form data for POST request
-            # Ensure query is a string before encoding
-            if not isinstance(query, str):
-                logger.error(f"Invalid query type before encoding. Got {type(query)}: {query}")
-                return []
-            
             data = {
                 'q': query,
                 'b': '',
@@ -149,18 +364,16 @@ class DuckDuckGoSearcher:
             }
 
             logger.info(f"Searching with query: {query}")
-            logger.info(f"POST request data: {data}")
-            logger.info(f"POST request headers: {self.HEADERS}")
-            #logger.info(f"POST request timeout: {30.0}")
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            logger.debug(f"POST request data: {data}")
+            with span("http.search"):
+                response = await get_http_client().post(
                     self.BASE_URL, data=data, headers=self.HEADERS, timeout=30.0
                 )
-                response.raise_for_status()
+            response.raise_for_status()
 
-            logger.info(f"HTTP Response: {response.text}")
+            logger.debug(f"HTTP Response: {response.text}")
             # Parse HTML response
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = BeautifulSoup(response.text, BS4_PARSER)
             if not soup:
                 logger.error("Failed to parse HTML response")
                 return []
@@ -178,11 +391,11 @@ class DuckDuckGoSearcher:
                 title = link_elem.get_text(strip=True)
                 link = link_elem.get("href", "")
 
-            # Skip ad results
+                # Skip ad results
                 if "y.js" in link:
                     continue
 
-            # Clean up DuckDuckGo redirect URLs
+                # Clean up DuckDuckGo redirect URLs
                 if link.startswith("//duckduckgo.com/l/?uddg="):
                     link = urllib.parse.unquote(link.split("uddg=")[1].split("&")[0])
 
@@ -217,49 +430,118 @@ class DuckDuckGoSearcher:
         return []
 
 
+STRIP_TAGS = ["script", "style", "nav", "header", "footer", "noscript", "svg"]
+
+
+def _iter_page_text(html: str):
+    """Yield visible text fragments in document order, skipping boilerplate tags."""
+    if FastHTMLParser is not None:
+        tree = FastHTMLParser(html)
+        tree.strip_tags(STRIP_TAGS)
+        root = tree.body or tree.root
+        if root is None:
+            return
+        for node in root.traverse(include_text=True):
+            if node.tag == "-text":
+                yield node.text(deep=False)
+    else:
+        soup = BeautifulSoup(html, BS4_PARSER)
+        for element in soup(STRIP_TAGS):
+            element.decompose()
+        yield from (soup.body or soup).strings
+
+
+def extract_page_text(html: str, max_chars: int) -> str:
+    """Collapse whitespace and stop as soon as `max_chars` of text has been collected."""
+    parts = []
+    length = 0
+    for fragment in _iter_page_text(html):
+        fragment = " ".join(fragment.split())
+        if not fragment:
+            continue
+        parts.append(fragment)
+        length += len(fragment) + 1
+        if length > max_chars:
+            break
+
+    text = " ".join(parts)
+    if len(text) > max_chars:
+        text = text[:max_chars] + "... [content truncated]"
+    return text
+
+
 class WebContentFetcher:
-    def __init__(self):
-        self.rate_limiter = RateLimiter(requests_per_minute=20)
+    MAX_BYTES = 2_000_000  # stop downloading after this much body
+    MAX_CHARS = 8000       # text budget returned to the LLM
+    MAX_MANY_URLS = 10     # pages per fetch_many call
+    MAX_MANY_DEADLINE = 60.0
+    MAX_MANY_CHARS = 24000  # text budget for a whole fetch_many call, shared between its pages
+    CACHE_MAX_ENTRIES = 128
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    }
+
+    def __init__(self, limiter: HostRateLimiter = rate_limiter):
+        self.rate_limiter = limiter
+        # url -> {"etag", "last_modified", "text"} for conditional GETs
+        self._cache: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        headers = dict(self.HEADERS)
+        cached = self._cache.get(url)
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def _remember(self, url: str, response: httpx.Response, text: str) -> None:
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if not (etag or last_modified):
+            return
+        self._cache[url] = {"etag": etag, "last_modified": last_modified, "text": text}
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+
+    async def _download(self, response: httpx.Response) -> str:
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) >= self.MAX_BYTES:
+                logger.info(f"Body of {response.url} exceeds {self.MAX_BYTES} bytes; truncating download")
+                break
+        return bytes(body[:self.MAX_BYTES]).decode(response.encoding or "utf-8", errors="replace")
 
     async def fetch_and_parse(self, url: str, ctx: Context) -> str:
         """Fetch and parse content from a webpage"""
         try:
-            await self.rate_limiter.acquire()
+            with span("rate_limit.wait"):
+                await self.rate_limiter.acquire(url)
 
             await ctx.info(f"Fetching content from: {url}")
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers={
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                    },
-                    follow_redirects=True,
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-
-            # Parse the HTML
-            soup = BeautifulSoup(response.text, "html.parser")
+            async with get_http_client().stream(
+                "GET",
+                url,
+                headers=self._conditional_headers(url),
+                follow_redirects=True,
+                timeout=30.0,
+            ) as response:
+                if response.status_code == 304 and url in self._cache:
+                    self._cache.move_to_end(url)
+                    text = self._cache[url]["text"]
+                    await ctx.info(f"Not modified; using cached content ({len(text)} characters)")
+                    return text
 
-            # Remove script and style elements
-            for element in soup(["script", "style", "nav", "header", "footer"]):
-                element.decompose()
-
-            # Get the text content
-            text = soup.get_text()
-
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = " ".join(chunk for chunk in chunks if chunk)
-
-            # Remove extra whitespace
-            text = re.sub(r"\s+", " ", text).strip()
+                response.raise_for_status()
+                html = await self._download(response)
 
-            # Truncate if too long
-            if len(text) > 8000:
-                text = text[:8000] + "... [content truncated]"
+            with span("html.extract", bytes=len(html)):
+                text = extract_page_text(html, self.MAX_CHARS)
+            self._remember(url, response, text)
 
             await ctx.info(
                 f"Successfully fetched and parsed content ({len(text)} characters)"
@@ -276,9 +558,42 @@ class WebContentFetcher:
             await ctx.error(f"Error fetching content from {url}: {str(e)}")
             return f"Error: An unexpected error occurred while fetching the webpage ({str(e)})"
 
+    async def fetch_many(
+        self, urls: List[str], ctx: Context, deadline: float = 60.0, concurrency: int = 5
+    ) -> Dict[str, str]:
+        """
+        Fetch up to MAX_MANY_URLS pages concurrently; pages unfinished at the deadline
+        report an error. Each page is cut to its share of MAX_MANY_CHARS.
+        """
+        urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))[:self.MAX_MANY_URLS]
+        deadline = min(max(float(deadline), 1.0), self.MAX_MANY_DEADLINE)
+        page_chars = self.MAX_MANY_CHARS // max(len(urls), 1)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_one(url: str) -> str:
+            async with semaphore:
+                return await self.fetch_and_parse(url, ctx)
+
+        tasks = {url: asyncio.create_task(fetch_one(url)) for url in urls}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=deadline)
+
+        results, pending = {}, []
+        for url, task in tasks.items():
+            if task.done():
+                text = task.result()
+                results[url] = text if len(text) <= page_chars else text[:page_chars] + "... [content truncated]"
+            else:
+                task.cancel()
+                pending.append(task)
+                results[url] = f"Error: Not fetched within the {deadline:.0f}s deadline."
+        await asyncio.gather(*pending, return_exceptions=True)
+        return results
+
 
 # Initialize FastMCP server
 mcp = FastMCP("ddg-search")
+trace_server_tools(mcp, service="websearch")
 searcher = DuckDuckGoSearcher()
 fetcher = WebContentFetcher()
 
@@ -329,6 +644,63 @@ async def fetch_content(url: str, ctx: Context) -> str:
     """
     return await fetcher.fetch_and_parse(url, ctx)
 
+
+@mcp.tool()
+async def fetch_many(
+    ctx: Context,
+    urls: Optional[List[str]] = None,
+    query: Optional[str] = None,
+    top_n: int = 3,
+    deadline: float = 60.0,
+) -> str:
+    """
+    Fetch and parse several webpages concurrently in one call. Usage: fetch_many|urls=["https://a.com", "https://b.com"] or fetch_many|query="tesla open patents"|top_n=3
+
+    Args:
+        urls: List of webpage URLs to fetch (at most 10 pages per call, including search results)
+        query: Optional search query; the top_n result pages are fetched as well
+        top_n: Number of search results to fetch when query is given (default: 3)
+        deadline: Overall time budget in seconds for all downloads (default and maximum: 60)
+        ctx: MCP context for logging
+    """
+    targets = list(urls or [])
+    if query:
+        top_n = min(max(top_n, 1), WebContentFetcher.MAX_MANY_URLS)
+        results = await searcher.search(str(query), ctx, max_results=top_n)
+        targets.extend(result.link for result in results[:top_n])
+
+    if not targets:
+        return "No URLs to fetch"
+    if len(targets) > WebContentFetcher.MAX_MANY_URLS:
+        await ctx.info(f"Fetching the first {WebContentFetcher.MAX_MANY_URLS} of {len(targets)} URLs")
+
+    pages = await fetcher.fetch_many(targets, ctx, deadline=deadline)
+    output = []
+    for i, (url, text) in enumerate(pages.items(), start=1):
+        output.append(f"{i}. URL: {url}")
+        output.append(f"   Content: {text}")
+        output.append("")
+    return "\n".join(output)
+
+@mcp.resource("cache://tools")
+def cache_policy() -> str:
+    """Which tools' results may be cached by the client, and for how long"""
+    return json.dumps({
+        "epoch": "1",
+        "tools": {
+            "search": {"ttl": 600},
+            "fetch_content": {"ttl": 300},
+            "fetch_many": {"ttl": 300},
+        },
+    })
+
+
+@mcp.resource("stats://rate_limits")
+def rate_limit_stats() -> str:
+    """Per-host tokens left (shared across processes) and this process's queue and wait metrics"""
+    return json.dumps(rate_limiter.stats(), indent=2)
+
+
 @mcp.tool()
 def send_email(text: str):
     """Creates spreadsheet in Google Drive and Sends Email to Gmail with the supplied text string"""
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Literal, Union
 
 # Input/Output models for tools
 
@@ -28,12 +28,45 @@ class ExpSumInput(BaseModel):
 class ExpSumOutput(BaseModel):
     result: float
 
+class ArrayBinaryInput(BaseModel):
+    op: Literal["add", "subtract", "multiply", "divide", "power", "remainder"]
+    a: List[Union[int, float]]
+    b: Union[List[Union[int, float]], int, float]
+
+class ArrayUnaryInput(BaseModel):
+    func: Literal["sin", "cos", "tan", "sqrt", "cbrt", "exp", "log", "factorial"]
+    values: List[Union[int, float]]
+
+class ArrayReduceInput(BaseModel):
+    op: Literal["sum", "prod", "mean", "min", "max", "std"]
+    values: List[Union[int, float]]
+
+class ArrayOutput(BaseModel):
+    result: List[Union[int, float, str]]
+
+class ReduceOutput(BaseModel):
+    result: Union[int, float]
+
+class ExpressionInput(BaseModel):
+    expression: str
+    variables: Dict[str, Union[int, float]] = {}
+    decimal: bool = False
+    precision: int = 50
+
+class ExpressionOutput(BaseModel):
+    result: str
+
 class PythonCodeInput(BaseModel):
     code: str
 
 class PythonCodeOutput(BaseModel):
     result: str
 
+class SqlQueryInput(BaseModel):
+    code: str
+    max_rows: int = Field(200, ge=1)
+    format: Literal["text", "json"] = "text"
+
 class UrlInput(BaseModel):
     url: str
 
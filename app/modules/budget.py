@@ -0,0 +1,137 @@
+# modules/budget.py → Prompt Budget
+# Role: Keeps LLM prompts inside a per-model token budget.
+
+# Responsibilities:
+
+# Count tokens per prompt section (tiktoken when installed, ~4 chars/token otherwise)
+
+# Trim sections to fit the budget from config/models.json
+
+# Compress oversized tool results to the sentences most similar to the user query
+
+# Dependencies: numpy, config/models.json, config/profiles.yaml
+
+# Used by: loop.py, decision.py
+
+# modules/budget.py
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import yaml
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or encoding files unavailable offline
+    _ENCODING = None
+
+ROOT = Path(__file__).parent.parent
+MODELS_JSON = ROOT / "config" / "models.json"
+PROFILE_YAML = ROOT / "config" / "profiles.yaml"
+
+DEFAULT_PROMPT_BUDGET = 8000
+DEFAULT_TOOL_RESULT_BUDGET = 1500
+MAX_COMPRESSION_CANDIDATES = 48  # passages embedded per compression
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text, disallowed_special=())[:max_tokens]) + "… [truncated]"
+    return text[:max_tokens * 4] + "… [truncated]"
+
+
+class PromptBudget:
+    def __init__(self, prompt_tokens: int = DEFAULT_PROMPT_BUDGET, tool_result_tokens: int = DEFAULT_TOOL_RESULT_BUDGET):
+        self.prompt_tokens = prompt_tokens
+        self.tool_result_tokens = tool_result_tokens
+
+    @classmethod
+    def for_model(cls, model_key: Optional[str] = None) -> "PromptBudget":
+        """Budget for `model_key`, or for the profile's text_generation model."""
+        config = json.loads(MODELS_JSON.read_text())
+        if model_key is None:
+            model_key = os.getenv("AGENT_TEXT_MODEL") or yaml.safe_load(PROFILE_YAML.read_text())["llm"]["text_generation"]
+        info = config["models"].get(model_key, {})
+        return cls(
+            prompt_tokens=info.get("prompt_token_budget", DEFAULT_PROMPT_BUDGET),
+            tool_result_tokens=info.get("tool_result_token_budget", DEFAULT_TOOL_RESULT_BUDGET),
+        )
+
+    def report(self, sections: Dict[str, str]) -> Dict[str, int]:
+        counts = {name: count_tokens(text) for name, text in sections.items()}
+        counts["total"] = sum(counts.values())
+        return counts
+
+    @staticmethod
+    def fit_lines(lines: List[str], max_tokens: int) -> List[str]:
+        """Keep lines in order until `max_tokens` is used; the last one may be truncated."""
+        kept, used = [], 0
+        for line in lines:
+            tokens = count_tokens(line)
+            if used + tokens > max_tokens:
+                remaining = max_tokens - used
+                if remaining > 20:
+                    kept.append(truncate_to_tokens(line, remaining))
+                break
+            kept.append(line)
+            used += tokens
+        return kept
+
+    def compress(
+        self,
+        text: str,
+        query: str,
+        embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Return `text` unchanged if it fits, otherwise the passages most similar
+        to `query` (kept in original order) up to `max_tokens`. `embed` turns a
+        list of texts into a matrix of embeddings in one call.
+        """
+        max_tokens = max_tokens or self.tool_result_tokens
+        if count_tokens(text) <= max_tokens:
+            return text
+        if embed is None:
+            return truncate_to_tokens(text, max_tokens)
+
+        sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+        group = -(-len(sentences) // MAX_COMPRESSION_CANDIDATES)  # ceil division
+        passages = [" ".join(sentences[i:i + group]) for i in range(0, len(sentences), group)]
+
+        try:
+            vectors = np.asarray(embed([query] + passages), dtype=np.float32)
+            query_vec, matrix = vectors[0], vectors[1:]
+        except Exception as e:
+            print(f"[budget] ⚠️ Embedding failed, truncating instead: {e}")
+            return truncate_to_tokens(text, max_tokens)
+
+        scores = matrix @ query_vec / (
+            np.linalg.norm(matrix, axis=1) * max(float(np.linalg.norm(query_vec)), 1e-12) + 1e-12
+        )
+        chosen, used = set(), 0
+        for i in np.argsort(-scores):
+            tokens = count_tokens(passages[i])
+            if used + tokens > max_tokens:
+                continue
+            chosen.add(int(i))
+            used += tokens
+
+        kept = " … ".join(passages[i] for i in sorted(chosen))
+        return kept or truncate_to_tokens(text, max_tokens)
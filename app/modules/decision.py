@@ -1,7 +1,13 @@
-from typing import List, Optional
+from contextlib import aclosing
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional
+from pydantic import BaseModel
 from modules.perception import PerceptionResult
 from modules.memory import MemoryItem
-from modules.model_manager import ModelManager
+from modules.model_manager import ModelManager, classify_difficulty
+from modules.action import parse_function_call
+from modules.schema import SchemaValidationError, validate_arguments
+from modules.tools import ToolRegistry
+from modules.budget import PromptBudget, count_tokens, truncate_to_tokens
 from dotenv import load_dotenv
 from google import genai
 import os
@@ -17,6 +23,85 @@ except ImportError:
         print(f"[{now}] [{stage}] {msg}")
 
 model = ModelManager()
+budget = PromptBudget.for_model(model.text_model_key)
+
+FINAL_ANSWER_FUNCTION = {
+    "name": "final_answer",
+    "description": "Finish the task. `answer` must be the actual final result, not a description.",
+    "parameters": {
+        "type": "object",
+        "properties": {"answer": {"type": "string"}},
+        "required": ["answer"],
+    },
+}
+
+
+class Plan(BaseModel):
+    kind: Literal["function_call", "final_answer"]
+    tool_name: Optional[str] = None
+    arguments: Dict[str, Any] = {}
+    answer: Optional[str] = None
+
+    @classmethod
+    def final(cls, answer: str) -> "Plan":
+        return cls(kind="final_answer", answer=answer)
+
+    def __str__(self) -> str:
+        if self.kind == "final_answer":
+            return f"FINAL_ANSWER: {self.answer}"
+        return f"FUNCTION_CALL: {self.tool_name}|{self.arguments}"
+
+
+def _plan_from_text(raw: str) -> Plan:
+    for line in raw.splitlines():
+        line = line.strip()
+        if line.startswith("FINAL_ANSWER:"):
+            return Plan.final(line[len("FINAL_ANSWER:"):].strip())
+        if line.startswith("FUNCTION_CALL:"):
+            tool_name, arguments = parse_function_call(line)
+            return Plan(kind="function_call", tool_name=tool_name, arguments=arguments)
+    raise ValueError("Reply contained neither a FUNCTION_CALL nor a FINAL_ANSWER line")
+
+
+def _plan_from_call(call: dict) -> Plan:
+    if call["name"] == FINAL_ANSWER_FUNCTION["name"]:
+        return Plan.final(str(call["arguments"].get("answer", "[unknown]")))
+    return Plan(kind="function_call", tool_name=call["name"], arguments=call["arguments"])
+
+
+def _validate_plan(plan: Plan, tools: Optional[List[Any]], registry: Optional[ToolRegistry]) -> Plan:
+    if plan.kind == "final_answer" or registry is None:
+        return plan
+    if plan.tool_name not in {t.name for t in tools}:
+        raise ValueError(f"Unknown tool '{plan.tool_name}'")
+    plan.arguments = validate_arguments(
+        registry.validators[plan.tool_name], registry.schemas[plan.tool_name], plan.arguments
+    )
+    return plan
+
+
+async def _stream_plan_text(prompt: str, on_answer_token: Callable[[str], Awaitable[None]]) -> str:
+    """
+    Stream a text-protocol reply, passing the FINAL_ANSWER line to `on_answer_token`
+    as it is written. Returns the complete reply.
+    """
+    raw, start, sent = "", None, 0
+    # aclosing: if on_answer_token raises, the model stream is released right away
+    async with aclosing(model.stream_text(prompt)) as pieces:
+        async for piece in pieces:
+            raw += piece
+            if start is None:
+                if "FUNCTION_CALL:" in raw:
+                    start = -1
+                elif "FINAL_ANSWER:" in raw:
+                    start = sent = raw.index("FINAL_ANSWER:") + len("FINAL_ANSWER:")
+            if start is not None and start >= 0:
+                end = raw.find("\n", start)
+                end = len(raw) if end == -1 else end
+                if end > sent:
+                    await on_answer_token(raw[sent:end])
+                    sent = end
+    return raw
 
 
 async def generate_plan(
@@ -24,14 +109,26 @@ async def generate_plan(
     memory_items: List[MemoryItem],
     tool_descriptions: Optional[str] = None,
     step_num: int = 1,
-    max_steps: int = 3
-) -> str:
-    """Generates the next step plan for the agent: either tool usage or final answer."""
-
-    memory_texts = "\n".join(f"- {m.text}" for m in memory_items) or "None"
+    max_steps: int = 3,
+    tools: Optional[List[Any]] = None,
+    registry: Optional[ToolRegistry] = None,
+    on_answer_token: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Plan:
+    """
+    Generates the next step plan for the agent: either tool usage or final answer.
+    With `tools`, uses native function calling and validates arguments against
+    each tool's inputSchema; a rejected reply is retried once with the errors.
+    `registry` supplies precompiled validators and declarations for the catalog.
+    With `on_answer_token`, the reply is streamed using the text protocol so a
+    FINAL_ANSWER reaches the caller token by token. The first step of a simple
+    request is routed to a cheaper model when profiles.yaml configures one.
+    """
+
+    memory_lines = [f"- {m.text}" for m in memory_items]
     tool_context = f"\nYou have access to the following tools:\n{tool_descriptions}" if tool_descriptions else ""
 
-    prompt = f"""
+    def render(memory_texts: str, tool_context: str) -> str:
+        return f"""
 You are a reasoning-driven AI agent with access to tools and memory.
 Your job is to solve the user's request step-by-step by reasoning through the problem, selecting a tool if needed, and continuing until the FINAL_ANSWER is produced.
 
@@ -55,7 +152,8 @@ Respond in **exactly one line** using one of the following formats:
 ✅ Examples:
 - FUNCTION_CALL: add|a=5|b=3
 - FUNCTION_CALL: strings_to_chars_to_int|input.string=INDIA
-- FUNCTION_CALL: int_list_to_exponential_sum|input.int_list=[73,78,68,73,65]
+- FUNCTION_CALL: int_list_to_exponential_sum|input.numbers=[73,78,68,73,65]
+- FUNCTION_CALL: evaluate_expression|input.expression="log(1250000) * 2 + sqrt(49)"
 - FINAL_ANSWER: [42] → Always mention final answer to the query, not that some other description.
 
 ✅ Examples:
@@ -70,28 +168,77 @@ Respond in **exactly one line** using one of the following formats:
 
 - 🚫 Do NOT invent tools. Use only the tools listed above. Tool description has useage pattern, only use that.
 - 📄 If the question may relate to public/factual knowledge (like companies, people, places), use the `search_documents` tool to look for the answer.
-- 🧮 If the question is mathematical, use the appropriate math tool.
+- 🧮 If the question is mathematical, use the appropriate math tool. When several arithmetic steps are needed on known numbers, do them all in one `evaluate_expression` call.
 - 🔁 Analyze that whether you have already got a good factual result from a tool, do NOT search again — summarize and respond with FINAL_ANSWER.
 - ❌ NEVER repeat tool calls with the same parameters unless the result was empty. When searching rely on first reponse from tools, as that is the best response probably.
 - ❌ NEVER output explanation text — only structured FUNCTION_CALL or FINAL_ANSWER.
-- ✅ Use nested keys like `input.string` or `input.int_list`, and square brackets for lists.
+- ✅ Use nested keys like `input.string` or `input.numbers`, and square brackets for lists.
 - 💡 If no tool fits or you're unsure, end with: FINAL_ANSWER: [unknown]
 - ⏳ You have 3 attempts. Final attempt must end with FINAL_ANSWER.
 """
 
-
-
-    try:
-        raw = (await model.generate_text(prompt)).strip()
+    # 📏 Enforce the model's prompt budget: trim memory first, then tool descriptions
+    prompt = render("\n".join(memory_lines) or "None", tool_context)
+    if count_tokens(prompt) > budget.prompt_tokens:
+        available = budget.prompt_tokens - count_tokens(render("None", tool_context))
+        memory_lines = PromptBudget.fit_lines(memory_lines, max(available, 0))
+        prompt = render("\n".join(memory_lines) or "None", tool_context)
+    if count_tokens(prompt) > budget.prompt_tokens:
+        available = budget.prompt_tokens - count_tokens(render("\n".join(memory_lines) or "None", ""))
+        tool_context = truncate_to_tokens(tool_context, max(available, 0))
+        prompt = render("\n".join(memory_lines) or "None", tool_context)
+    counts = budget.report({
+        "base": render("None", ""),
+        "memory": "\n".join(memory_lines),
+        "tools": tool_context,
+    })
+    log("budget", f"Prompt tokens {counts} (budget {budget.prompt_tokens})")
+
+
+
+    if tools is not None and registry is None:
+        registry = ToolRegistry.for_tools(tools)
+    stream = on_answer_token is not None and model.supports_streaming
+    structured = tools is not None and model.supports_tool_calls and not stream
+    functions = [registry.functions[t.name] for t in tools or []] + [FINAL_ANSWER_FUNCTION]
+    # Only the function-calling request gets this; a fallback to the text protocol uses `prompt`
+    structured_prompt = prompt + "\nCall exactly one function. To finish, call `final_answer` instead of writing FINAL_ANSWER.\n"
+    feedback = ""
+    # Later steps synthesize from tool results and stay on the default model
+    difficulty = classify_difficulty(perception.user_input) if step_num == 1 else "complex"
+
+    def parse_call(call: dict) -> Plan:
+        log("plan", f"LLM tool call: {call}")
+        return _validate_plan(_plan_from_call(call), tools, registry)
+
+    def parse_text(raw: str) -> Plan:
+        raw = raw.strip()
         log("plan", f"LLM output: {raw}")
-
-        for line in raw.splitlines():
-            if line.strip().startswith("FUNCTION_CALL:") or line.strip().startswith("FINAL_ANSWER:"):
-                return line.strip()
-
-        return "FINAL_ANSWER: [unknown]"
-
-    except Exception as e:
-        log("plan", f"⚠️ Planning failed: {e}")
-        return "FINAL_ANSWER: [unknown]"
+        return _validate_plan(_plan_from_text(raw), tools, registry)
+
+    for attempt in range(2):
+        try:
+            if structured:
+                return await model.generate_routed(structured_prompt + feedback, parse_call, "plan", difficulty, functions=functions)
+            if stream:
+                raw = (await _stream_plan_text(prompt + feedback, on_answer_token)).strip()
+                log("plan", f"LLM output (streamed): {raw}")
+                return _validate_plan(_plan_from_text(raw), tools, registry)
+            return await model.generate_routed(prompt + feedback, parse_text, "plan", difficulty)
+
+        except (SchemaValidationError, ValueError) as e:
+            log("plan", f"⚠️ Rejected plan (attempt {attempt + 1}): {e}")
+            feedback = f"\n\n⚠️ Your previous reply was rejected: {e}\nReply again with a corrected call."
+        except Exception as e:
+            if stream:
+                log("plan", f"⚠️ Streaming failed, retrying without streaming: {e}")
+                stream = False
+                continue
+            if not structured:
+                log("plan", f"⚠️ Planning failed: {e}")
+                break
+            log("plan", f"⚠️ Function calling failed, falling back to text protocol: {e}")
+            structured = False
+
+    return Plan.final("[unknown]")
 
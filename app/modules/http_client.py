@@ -0,0 +1,279 @@
+# modules/http_client.py → Resilient Model Client
+# Role: One place for timeouts, retries, circuit breaking and hedging on outbound model calls.
+
+# Responsibilities:
+
+# Connect/read timeouts on every request, so a hung backend can't block a server or the agent
+
+# Jittered exponential retries for transient failures (connection errors, timeouts, 429/5xx)
+
+# A circuit breaker per endpoint that fails fast while a backend is down, then lets one probe through
+
+# Hedged requests for idempotent calls (embeddings): a second copy once the first outlives the endpoint's p95
+
+# Dependencies: requests, modules/tracing.py
+
+# Used by: model_manager.py, memory.py, mcp_server_2.py
+
+# Note: MCP servers speak over stdout, so this module never prints; retries and hedges are
+# recorded on the current trace span and in ResilientClient.stats().
+
+# modules/http_client.py
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.tracing import current_span
+
+CONNECT_TIMEOUT_S = float(os.getenv("MODEL_CONNECT_TIMEOUT_S", 3.05))
+READ_TIMEOUT_S = float(os.getenv("MODEL_READ_TIMEOUT_S", 120))  # generation on a CPU-bound Ollama is slow
+EMBED_TIMEOUT_S = float(os.getenv("MODEL_EMBED_TIMEOUT_S", 15))
+RETRIES = int(os.getenv("MODEL_HTTP_RETRIES", 3))  # attempts after the first
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8.0
+BREAKER_THRESHOLD = 5  # consecutive transient failures that open a circuit
+BREAKER_RESET_S = 30.0  # open for this long, then one probe request decides
+HEDGE_DEFAULT_DELAY_S = 1.0  # until an endpoint has enough samples for a p95
+HEDGE_MIN_DELAY_S = 0.05
+HEDGE_MIN_SAMPLES = 20
+POOL_SIZE = 16
+
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the backend while its circuit is open."""
+
+
+def is_transient(error: Exception) -> bool:
+    """Worth retrying: connection problems, timeouts and throttling or server-side HTTP errors."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in TRANSIENT_STATUS
+    return getattr(error, "code", None) in TRANSIENT_STATUS  # e.g. google.genai APIError
+
+
+def endpoint_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def _annotate(**attrs) -> None:
+    span = current_span()
+    if span is not None:
+        span.set(**attrs)
+
+
+class CircuitBreaker:
+    """Closed → open after `threshold` consecutive failures → half-open after `reset_after`."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET_S):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class Endpoint:
+    """Breaker, recent latencies and counters for one backend URL (or named SDK call)."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latencies: deque = deque(maxlen=200)
+        self.counts = {"calls": 0, "failures": 0, "retries": 0, "rejected": 0, "hedges": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))] if len(ordered) >= HEDGE_MIN_SAMPLES else None
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return HEDGE_DEFAULT_DELAY_S if p95 is None else max(HEDGE_MIN_DELAY_S, p95)
+
+
+class ResilientClient:
+    """
+    Shared HTTP client for model backends. Every request gets connect/read timeouts;
+    `call` adds retries and circuit breaking to any single-request function, so SDK
+    clients (Gemini) go through the same policy as raw HTTP.
+    """
+
+    def __init__(self, retries: int = RETRIES, connect_timeout: float = CONNECT_TIMEOUT_S,
+                 read_timeout: float = READ_TIMEOUT_S, pool_size: int = POOL_SIZE):
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._endpoints: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="hedge")
+
+    def endpoint(self, key: str) -> Endpoint:
+        with self._lock:
+            if key not in self._endpoints:
+                self._endpoints[key] = Endpoint()
+            return self._endpoints[key]
+
+    def call(self, key: str, fn: Callable[[], T], retries: Optional[int] = None) -> T:
+        """Run `fn` (one request to endpoint `key`) behind its circuit breaker, retrying transient errors."""
+        endpoint = self.endpoint(key)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            if not endpoint.breaker.allow():
+                endpoint.count("rejected")
+                _annotate(circuit="open")
+                raise CircuitOpenError(f"{key}: circuit open after repeated failures")
+
+            endpoint.count("calls")
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                transient = is_transient(e)
+                endpoint.breaker.record(ok=not transient)
+                if not transient or attempt == retries:
+                    endpoint.count("failures")
+                    raise
+                endpoint.count("retries")
+                _annotate(retries=attempt + 1)
+                # Full jitter keeps clients that failed together from retrying together
+                time.sleep(random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt)))
+                continue
+
+            endpoint.breaker.record(ok=True)
+            with endpoint._lock:
+                endpoint.latencies.append(time.perf_counter() - start)
+            return result
+
+    def _hedged(self, key: str, fn: Callable[[], T]) -> T:
+        """Send a second copy of an idempotent request if the first is slower than usual; first success wins."""
+        endpoint = self.endpoint(key)
+        first = self._hedge_pool.submit(fn)
+        try:
+            return first.result(timeout=endpoint.hedge_delay())
+        except FutureTimeout:
+            pass
+
+        endpoint.count("hedges")
+        _annotate(hedged=True)
+        second = self._hedge_pool.submit(fn)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        endpoint.count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def post_json(self, url: str, payload: dict, timeout: Optional[float] = None,
+                  hedge: bool = False, retries: Optional[int] = None) -> Any:
+        """POST `payload` and return the decoded JSON reply. Only hedge idempotent requests."""
+        timeouts = (self.connect_timeout, timeout or self.read_timeout)
+
+        def once():
+            response = self.session.post(url, json=payload, timeout=timeouts)
+            response.raise_for_status()
+            return response.json()
+
+        key = endpoint_key(url)
+        return self.call(key, (lambda: self._hedged(key, once)) if hedge else once, retries)
+
+    def get_bytes(self, url: str, timeout: Optional[float] = None) -> bytes:
+        def once():
+            response = self.session.get(url, timeout=(self.connect_timeout, timeout or self.read_timeout))
+            response.raise_for_status()
+            return response.content
+
+        return self.call(endpoint_key(url), once)
+
+    @contextmanager
+    def stream_lines(self, url: str, payload: dict, timeout: Optional[float] = None) -> Iterator[Iterator[bytes]]:
+        """
+        POST with a streamed reply and yield its lines. Retries cover connecting and the
+        response status only; the read timeout bounds each gap between chunks.
+        """
+        timeouts = (self.connect_timeout, timeout or self.read_timeout)
+
+        def open_stream():
+            response = self.session.post(url, json=payload, stream=True, timeout=timeouts)
+            try:
+                response.raise_for_status()
+            except Exception:
+                response.close()
+                raise
+            return response
+
+        response = self.call(endpoint_key(url), open_stream)
+        with response:
+            yield response.iter_lines()
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {
+            key: {
+                **endpoint.counts,
+                "circuit": endpoint.breaker.state,
+                "p95_ms": round(endpoint.p95() * 1000, 1) if endpoint.p95() is not None else None,
+            }
+            for key, endpoint in endpoints.items()
+        }
+
+
+# Shared per process: connection pools, breakers and latency history are per backend, not per caller
+model_client = ResilientClient()
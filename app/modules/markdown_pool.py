@@ -0,0 +1,276 @@
+# modules/markdown_pool.py → Markdown Conversion Pool
+# Role: Converts documents to Markdown with MarkItDown across worker processes.
+
+# Responsibilities:
+
+# One MarkItDown converter per worker process, built on its first file; workers are plain
+# `python -m modules.markdown_pool` processes, so they never import the MCP server
+
+# One shared pool per server process; its converter processes are stopped when an indexing run ends
+
+# Per-file timeout: a conversion that hangs has its worker killed and replaced
+
+# Dispatch files largest first so one big file doesn't finish last on an otherwise idle pool
+
+# Hand back conversions as they complete, so the caller can chunk and embed while others convert
+
+# Per-format throughput (files, MB, seconds, MB/s, share of conversion time)
+
+# Dependencies: markitdown
+
+# Used by: mcp_server_2.py (process_documents)
+
+# modules/markdown_pool.py
+
+import atexit
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Each worker holds a MarkItDown instance (~100 MB), so only a few run by default
+CONVERT_WORKERS = int(os.getenv("DOCUMENT_CONVERT_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+CONVERT_TIMEOUT_S = float(os.getenv("DOCUMENT_CONVERT_TIMEOUT_S", 120))  # per file; the worker is then killed
+APP_ROOT = Path(__file__).resolve().parent.parent
+
+_converter = None  # per worker process
+
+
+class ConversionError(RuntimeError):
+    """A file a worker failed to convert; the message is the worker's error."""
+
+
+def _convert(path: str) -> tuple:
+    global _converter
+    if _converter is None:
+        from markitdown import MarkItDown
+        _converter = MarkItDown()
+    start = time.perf_counter()
+    markdown = _converter.convert(path).text_content
+    return markdown, time.perf_counter() - start
+
+
+def _serve() -> None:
+    """Worker loop: one JSON path per stdin line in, one JSON reply per stdout line out."""
+    replies = sys.stdout
+    sys.stdout = sys.stderr  # anything a converter prints must not land among the replies
+    for line in sys.stdin:
+        try:
+            markdown, seconds = _convert(json.loads(line))
+            reply = {"markdown": markdown, "seconds": seconds}
+        except Exception as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        replies.write(json.dumps(reply) + "\n")  # ASCII-only, whatever the console encoding
+        replies.flush()
+
+
+class _Worker:
+    """
+    A converter process started as `python -m modules.markdown_pool`. Unlike a
+    multiprocessing child it never re-imports the server's main module, so it holds
+    only MarkItDown.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "modules.markdown_pool"],
+            cwd=APP_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        self.replies: "queue.Queue[str]" = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self) -> None:
+        for line in self.process.stdout:
+            self.replies.put(line)
+        self.replies.put("")  # the worker exited
+
+    def convert(self, path: Path, timeout: float = CONVERT_TIMEOUT_S) -> tuple:
+        self.process.stdin.write(json.dumps(str(path.resolve())) + "\n")
+        self.process.stdin.flush()
+        try:
+            line = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.process.kill()
+            self.process.wait()  # reaped, so the pool sees it exited and replaces it
+            raise TimeoutError(f"conversion took longer than {timeout:.0f}s") from None
+        if not line:
+            raise RuntimeError(f"converter process exited with code {self.process.wait()}")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise ConversionError(reply["error"])
+        return reply["markdown"], reply["seconds"]
+
+    def close(self) -> None:
+        try:
+            self.process.stdin.close()  # the worker exits at end of input
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class ConversionPool:
+    """
+    Up to `size` converter processes, started on demand and kept until `release()`
+    at the end of an indexing run. Each dispatch thread borrows one idle worker for
+    one file; a worker that crashes or times out is replaced on the next file.
+    """
+
+    def __init__(self, size: int = CONVERT_WORKERS):
+        self.size = size
+        self._threads = ThreadPoolExecutor(max_workers=size, thread_name_prefix="markitdown")
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _run(self, path: Path) -> tuple:
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        try:
+            worker = worker or _Worker()
+        except OSError:
+            return _convert(str(path))  # in-process fallback when no process can start
+        try:
+            result = worker.convert(path)
+        except Exception:
+            if worker.process.poll() is not None:  # crashed or killed: replace it on the next file
+                worker.close()
+                worker = None
+            raise
+        finally:
+            if worker is not None:
+                with self._lock:
+                    self._idle.append(worker)
+        return result
+
+    def submit(self, path: Path):
+        return self._threads.submit(self._run, path)
+
+    def release(self) -> None:
+        """Stop the idle worker processes; later submissions start new ones."""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(cancel_futures=True)
+        self.release()
+
+
+_pool: Optional[ConversionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ConversionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConversionPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+@dataclass
+class Conversion:
+    path: Path
+    markdown: str = ""
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class ConversionStats:
+    """Conversion time and volume per file extension, for every extractor used during indexing."""
+
+    def __init__(self):
+        self.formats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"files": 0, "bytes": 0, "seconds": 0.0, "failed": 0})
+        self.wall_seconds = 0.0
+
+    def add(self, path: Path, seconds: float, failed: bool = False) -> None:
+        entry = self.formats[path.suffix.lower() or "(none)"]
+        entry["files"] += 1
+        entry["bytes"] += path.stat().st_size
+        entry["seconds"] += seconds
+        entry["failed"] += int(failed)
+
+    def report(self) -> List[dict]:
+        total = sum(e["seconds"] for e in self.formats.values()) or None
+        rows = [
+            {
+                "format": fmt,
+                "files": int(e["files"]),
+                "failed": int(e["failed"]),
+                "mb": round(e["bytes"] / 1e6, 3),
+                "seconds": round(e["seconds"], 3),
+                "mb_per_s": round(e["bytes"] / 1e6 / e["seconds"], 3) if e["seconds"] else None,
+                "share": round(e["seconds"] / total, 3) if total else None,
+            }
+            for fmt, e in self.formats.items()
+        ]
+        return sorted(rows, key=lambda r: -r["seconds"])
+
+    def lines(self) -> List[str]:
+        out = [f"{'format':<8}{'files':>6}{'failed':>8}{'MB':>9}{'conv s':>9}{'MB/s':>8}{'share':>8}"]
+        for r in self.report():
+            rate = f"{r['mb_per_s']:.2f}" if r["mb_per_s"] is not None else "-"
+            share = f"{r['share'] * 100:.0f}%" if r["share"] is not None else "-"
+            out.append(
+                f"{r['format']:<8}{r['files']:>6}{r['failed']:>8}{r['mb']:>9.2f}{r['seconds']:>9.2f}{rate:>8}{share:>8}"
+            )
+        out.append(f"conversion wall time {self.wall_seconds:.2f}s (per-format seconds are summed across workers)")
+        return out
+
+
+class ConversionBatch:
+    """
+    Conversions in flight. `ready()` takes the finished ones without waiting, so the
+    caller can index them between its own work; iterating waits for the rest in
+    completion order. Failures come back with `error` set rather than raised.
+    """
+
+    def __init__(self, pool: ConversionPool, paths: List[Path]):
+        self.pool = pool
+        self._futures = {pool.submit(path): path for path in paths}
+
+    def _take(self, future) -> Conversion:
+        path = self._futures.pop(future)
+        try:
+            markdown, seconds = future.result()
+        except Exception as e:
+            return Conversion(path=path, error=str(e) if isinstance(e, ConversionError) else f"{type(e).__name__}: {e}")
+        return Conversion(path=path, markdown=markdown, seconds=seconds)
+
+    def ready(self) -> Iterator[Conversion]:
+        for future in [f for f in self._futures if f.done()]:
+            yield self._take(future)
+
+    def __iter__(self) -> Iterator[Conversion]:
+        for future in as_completed(list(self._futures)):
+            yield self._take(future)
+
+    def close(self) -> None:
+        """Cancel what hasn't started and stop the pool's worker processes."""
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self.pool.release()
+
+
+def convert_all(paths: List[Path]) -> ConversionBatch:
+    """
+    Start converting `paths` with MarkItDown on the shared pool, largest first. Jobs
+    are submitted before this returns, so the caller can do other work meanwhile;
+    close the batch when indexing ends.
+    """
+    ordered = sorted(paths, key=lambda p: p.stat().st_size, reverse=True)
+    return ConversionBatch(get_conversion_pool(), ordered)
+
+
+if __name__ == "__main__":
+    _serve()
@@ -11,7 +11,7 @@
 
 # Dependencies:
 
-# faiss, requests, pydantic
+# faiss, pydantic, modules/http_client.py
 
 # Used by: context.py, loop.py
 
@@ -24,9 +24,10 @@
 from typing import List, Optional, Literal
 from pydantic import BaseModel
 from datetime import datetime
-import requests
 import numpy as np
 import faiss
+from modules.tracing import span
+from modules.http_client import EMBED_TIMEOUT_S, model_client
 
 
 class MemoryItem(BaseModel):
@@ -48,12 +49,30 @@ class MemoryManager:
         self.embeddings: List[np.ndarray] = []
 
     def _get_embedding(self, text: str) -> np.ndarray:
-        response = requests.post(
-            self.embedding_model_url,
-            json={"model": self.model_name, "prompt": text}
-        )
-        response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype=np.float32)
+        with span("memory.embed", model=self.model_name, chars=len(text)):
+            # Embeddings are idempotent, so a slow request is hedged rather than waited out
+            response = model_client.post_json(
+                self.embedding_model_url,
+                {"model": self.model_name, "prompt": text},
+                timeout=EMBED_TIMEOUT_S,
+                hedge=True,
+            )
+        return np.array(response["embedding"], dtype=np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self._get_embedding(text)
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed many texts in one request (Ollama /api/embed); per-text requests if that endpoint is missing."""
+        batch_url = self.embedding_model_url.replace("/api/embeddings", "/api/embed")
+        with span("memory.embed_batch", model=self.model_name, texts=len(texts)):
+            try:
+                response = model_client.post_json(
+                    batch_url, {"model": self.model_name, "input": texts}, timeout=EMBED_TIMEOUT_S, retries=0
+                )
+                return np.array(response["embeddings"], dtype=np.float32)
+            except Exception:
+                return np.stack([self._get_embedding(text) for text in texts])
 
     def add(self, item: MemoryItem):
         embedding = self._get_embedding(item.text)
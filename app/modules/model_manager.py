@@ -1,45 +1,354 @@
 import os
+import re
 import json
+import time
+import asyncio
+import itertools
+import threading
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 import yaml
-import requests
 from pathlib import Path
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
+from modules.schema import to_gemini_schema
+from modules.budget import count_tokens
+from modules.http_client import READ_TIMEOUT_S, model_client
+from modules.tracing import span
 
 load_dotenv()
 
 ROOT = Path(__file__).parent.parent
 MODELS_JSON = ROOT / "config" / "models.json"
 PROFILE_YAML = ROOT / "config" / "profiles.yaml"
+DEFAULT_OLLAMA_BASE_URL = "http://localhost:11434"
+RULES_ROUTE = "rules"  # route entry answered by the caller's rule-based handler, no model involved
+
+# Short arithmetic requests ("add 5 and 3", "log(1250000) * 2") that small models and rules handle well
+SIMPLE_MAX_CHARS = 160
+_ARITHMETIC = re.compile(
+    r"\b(?:add|sum|plus|minus|subtract|multiply|times|divide|product|sqrt|square root|log|power|"
+    r"factorial|exponential|cube|fibonacci|ascii)\b|[\d)]\s*[-+*/^%]\s*[\d(]",
+    re.I,
+)
+_LOOKUP = re.compile(r"https?://|\b(?:document|pdf|page|search|web|news|summar|relationship|explain|who|why)", re.I)
+_NAMED = re.compile(r"(?<=\s)[A-Z][a-z]+")  # a person, company or place mid-sentence means a lookup
+
+
+def classify_difficulty(text: str) -> str:
+    """'simple' for a short arithmetic request that needs no lookup; 'complex' otherwise."""
+    text = text.strip()
+    if len(text) <= SIMPLE_MAX_CHARS and _ARITHMETIC.search(text) and not (_LOOKUP.search(text) or _NAMED.search(text)):
+        return "simple"
+    return "complex"
+
+
+def ollama_url(url: str) -> str:
+    """Point a configured Ollama URL at OLLAMA_BASE_URL (e.g. the benchmark's local stand-in)."""
+    base = os.getenv("OLLAMA_BASE_URL")
+    return url.replace(DEFAULT_OLLAMA_BASE_URL, base.rstrip("/"), 1) if base and url else url
+
+
+async def _iterate_in_thread(make_iterator: Callable[[], Iterator[str]]) -> AsyncIterator[str]:
+    """
+    Drive a blocking iterator in a worker thread and yield its items on the event loop.
+    If the consumer stops early, the thread stops at the next item and closes the
+    iterator, which releases the underlying stream (e.g. the HTTP response).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def put(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # the loop has closed; nobody is listening
+            stop.set()
+
+    def produce():
+        iterator = None
+        try:
+            iterator = make_iterator()
+            for item in iterator:
+                if stop.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            put(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            put(done)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+    await producer
+
 
 class ModelManager:
-    def __init__(self):
+    # Routed-call outcomes across every instance in this process, keyed "<call>.<difficulty>:<model>"
+    route_metrics: Dict[str, Dict[str, float]] = {}
+
+    def __init__(self, model_key: Optional[str] = None):
         self.config = json.loads(MODELS_JSON.read_text())
         self.profile = yaml.safe_load(PROFILE_YAML.read_text())
 
-        self.text_model_key = self.profile["llm"]["text_generation"]
+        # AGENT_TEXT_MODEL overrides the profile, e.g. to run the benchmark on an Ollama model
+        self.text_model_key = model_key or os.getenv("AGENT_TEXT_MODEL") or self.profile["llm"]["text_generation"]
         self.model_info = self.config["models"][self.text_model_key]
+        if "url" in self.model_info:
+            self.model_info = {**self.model_info, "url": {k: ollama_url(v) for k, v in self.model_info["url"].items()}}
         self.model_type = self.model_info["type"]
 
         # ✅ Gemini initialization (your style)
         if self.model_type == "gemini":
             api_key = os.getenv("GEMINI_API_KEY")
-            self.client = genai.Client(api_key=api_key)
+            self.client = genai.Client(
+                api_key=api_key, http_options=types.HttpOptions(timeout=int(READ_TIMEOUT_S * 1000))
+            )
+
+        self.routing = self.profile.get("routing", {})
+        self._routed: Dict[str, "ModelManager"] = {self.text_model_key: self}
+
+    # ------------------------------------------------------------------
+    # Routing: cheap models first for easy calls, this model as the fallback
+    # ------------------------------------------------------------------
+
+    def route(self, call_type: str, difficulty: str = "complex") -> List[str]:
+        """Models to try, in order, for a call; the default text model is always last."""
+        candidates = []
+        if self.routing.get("enabled"):
+            for key in self.routing.get("routes", {}).get(f"{call_type}.{difficulty}", []):
+                if key == RULES_ROUTE or key in self.config["models"]:
+                    candidates.append(key)
+                else:
+                    print(f"[router] ⚠️ Unknown model in route {call_type}.{difficulty}: {key}")
+        return [key for key in candidates if key != self.text_model_key] + [self.text_model_key]
+
+    def _backend(self, key: str) -> "ModelManager":
+        if key not in self._routed:
+            self._routed[key] = ModelManager(key)
+        return self._routed[key]
+
+    def _record_route(self, route: str, key: str, outcome: str, elapsed: float,
+                      prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        metrics = ModelManager.route_metrics.setdefault(f"{route}:{key}", {
+            "calls": 0, "ok": 0, "failed": 0, "declined": 0,
+            "latency_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+        })
+        price = self.config["models"].get(key, {}).get("cost_per_1m_tokens", {})
+        metrics["calls"] += 1
+        metrics[outcome] += 1
+        metrics["latency_ms"] += elapsed * 1000
+        metrics["prompt_tokens"] += prompt_tokens
+        metrics["completion_tokens"] += completion_tokens
+        metrics["cost_usd"] += (prompt_tokens * price.get("input", 0) + completion_tokens * price.get("output", 0)) / 1e6
+
+    @classmethod
+    def route_report(cls) -> List[Dict[str, Any]]:
+        """Per route and model: calls, outcomes, mean latency, tokens and estimated cost."""
+        rows = []
+        for name, m in sorted(cls.route_metrics.items()):
+            route, model = name.split(":", 1)
+            rows.append({
+                "route": route,
+                "model": model,
+                **{k: m[k] for k in ("calls", "ok", "failed", "declined", "prompt_tokens", "completion_tokens")},
+                "mean_latency_ms": round(m["latency_ms"] / m["calls"], 1) if m["calls"] else 0.0,
+                "cost_usd": round(m["cost_usd"], 6),
+            })
+        return rows
+
+    async def generate_routed(
+        self,
+        prompt: str,
+        parse: Callable[[Any], Any],
+        call_type: str,
+        difficulty: str = "complex",
+        functions: Optional[list[dict]] = None,
+        rules: Optional[Callable[[], Optional[str]]] = None,
+    ) -> Any:
+        """
+        Return `parse(reply)` from the first routed model whose reply parses. With
+        `functions` the reply is a tool call as from generate_tool_call. A "rules" route
+        entry asks `rules()` instead of a model; None means it has no answer. Failures
+        fall through to the next model; the default model's failure is raised.
+        """
+        route = f"{call_type}.{difficulty}"
+        candidates = self.route(call_type, difficulty)
+        for i, key in enumerate(candidates):
+            start = time.perf_counter()
+            if key == RULES_ROUTE:
+                reply = rules() if rules else None
+                if reply is None:
+                    self._record_route(route, key, "declined", time.perf_counter() - start)
+                    continue
+            else:
+                backend = self._backend(key)
+                try:
+                    if functions is not None:
+                        reply = await backend.generate_tool_call(prompt, functions)
+                    else:
+                        reply = await backend.generate_text(prompt)
+                except Exception as e:
+                    self._record_route(route, key, "failed", time.perf_counter() - start, count_tokens(prompt))
+                    if i == len(candidates) - 1:
+                        raise
+                    print(f"[router] ⚠️ {key} failed on {route}, falling back: {e}")
+                    continue
+
+            tokens = (0, 0) if key == RULES_ROUTE else (count_tokens(prompt), count_tokens(reply if isinstance(reply, str) else json.dumps(reply, default=str)))
+            try:
+                result = parse(reply)
+            except Exception as e:
+                self._record_route(route, key, "failed", time.perf_counter() - start, *tokens)
+                if i == len(candidates) - 1:
+                    raise
+                print(f"[router] ⚠️ Unparseable {key} reply on {route}, falling back: {e}")
+                continue
+            self._record_route(route, key, "ok", time.perf_counter() - start, *tokens)
+            if key != self.text_model_key:
+                print(f"[router] {route} → {key}")
+            return result
 
+    # The HTTP clients below are blocking; running them in a worker thread keeps the
+    # event loop free for concurrent work (e.g. speculative tool prefetch).
     async def generate_text(self, prompt: str) -> str:
-        if self.model_type == "gemini":
-            return self._gemini_generate(prompt)
+        with span("llm.generate", model=self.text_model_key, prompt_chars=len(prompt)):
+            if self.model_type == "gemini":
+                return await asyncio.to_thread(self._gemini_generate, prompt)
 
-        elif self.model_type == "ollama":
-            return self._ollama_generate(prompt)
+            elif self.model_type == "ollama":
+                return await asyncio.to_thread(self._ollama_generate, prompt)
 
         raise NotImplementedError(f"Unsupported model type: {self.model_type}")
 
+    @property
+    def supports_tool_calls(self) -> bool:
+        return self.model_type in ("gemini", "ollama")
+
+    async def generate_tool_call(self, prompt: str, functions: list[dict]) -> dict:
+        """
+        Ask the model for exactly one call to one of `functions`
+        ({"name", "description", "parameters": JSON Schema} dicts).
+        Returns {"name": ..., "arguments": {...}}.
+        """
+        with span("llm.tool_call", model=self.text_model_key, prompt_chars=len(prompt), functions=len(functions)):
+            if self.model_type == "gemini":
+                return await asyncio.to_thread(self._gemini_tool_call, prompt, functions)
+
+            elif self.model_type == "ollama":
+                return await asyncio.to_thread(self._ollama_tool_call, prompt, functions)
+
+        raise NotImplementedError(f"Tool calls unsupported for model type: {self.model_type}")
+
+    @property
+    def supports_streaming(self) -> bool:
+        return self.model_type in ("gemini", "ollama")
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the reply to `prompt` in pieces as the model produces them."""
+        if self.model_type == "gemini":
+            source = lambda: self._gemini_stream(prompt)
+        elif self.model_type == "ollama":
+            source = lambda: self._ollama_stream(prompt)
+        else:
+            raise NotImplementedError(f"Streaming unsupported for model type: {self.model_type}")
+
+        with span("llm.stream", model=self.text_model_key, prompt_chars=len(prompt)) as stream_span:
+            first = True
+            async with aclosing(_iterate_in_thread(source)) as pieces:
+                async for piece in pieces:
+                    if first:
+                        stream_span.set(first_token_ms=round(stream_span.elapsed_ms(), 1))
+                        first = False
+                    yield piece
+
+    def _gemini_stream(self, prompt: str) -> Iterator[str]:
+        def open_stream():
+            # The SDK sends the request lazily; pulling the first chunk makes failures retryable
+            chunks = iter(self.client.models.generate_content_stream(model=self.model_info["model"], contents=prompt))
+            return chunks, next(chunks, None)
+
+        chunks, first = model_client.call("gemini:generate_stream", open_stream)
+        for chunk in itertools.chain([first] if first is not None else [], chunks):
+            if chunk.text:
+                yield chunk.text
+
+    def _ollama_stream(self, prompt: str) -> Iterator[str]:
+        with model_client.stream_lines(
+            self.model_info["url"]["generate"],
+            {"model": self.model_info["model"], "prompt": prompt, "stream": True},
+        ) as lines:
+            for line in lines:
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+
+    def _gemini_tool_call(self, prompt: str, functions: list[dict]) -> dict:
+        declarations = [
+            types.FunctionDeclaration(
+                name=f["name"],
+                description=f.get("description") or "",
+                parameters=f["gemini_parameters"] if "gemini_parameters" in f else (
+                    to_gemini_schema(f["parameters"]) if f.get("parameters", {}).get("properties") else None
+                ),
+            )
+            for f in functions
+        ]
+        response = model_client.call("gemini:generate", lambda: self.client.models.generate_content(
+            model=self.model_info["model"],
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                tools=[types.Tool(function_declarations=declarations)],
+                tool_config=types.ToolConfig(
+                    function_calling_config=types.FunctionCallingConfig(mode="ANY")
+                ),
+                automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+            ),
+        ))
+        calls = response.function_calls
+        if not calls:
+            raise ValueError(f"Model returned no function call: {response.text!r}")
+        return {"name": calls[0].name, "arguments": dict(calls[0].args or {})}
+
+    def _ollama_tool_call(self, prompt: str, functions: list[dict]) -> dict:
+        catalog = json.dumps(
+            [{"name": f["name"], "description": f.get("description"), "parameters": f.get("parameters")} for f in functions]
+        )
+        json_prompt = (
+            f"{prompt}\n\nAvailable functions (JSON Schema parameters):\n{catalog}\n\n"
+            'Reply with only a JSON object: {"name": "<function name>", "arguments": {...}}'
+        )
+        response = model_client.post_json(
+            self.model_info["url"]["generate"],
+            {"model": self.model_info["model"], "prompt": json_prompt, "format": "json", "stream": False}
+        )
+        call = json.loads(response["response"])
+        if not isinstance(call, dict) or "name" not in call:
+            raise ValueError(f"Model returned no function call: {call!r}")
+        return {"name": call["name"], "arguments": call.get("arguments") or {}}
+
     def _gemini_generate(self, prompt: str) -> str:
-        response = self.client.models.generate_content(
+        response = model_client.call("gemini:generate", lambda: self.client.models.generate_content(
             model=self.model_info["model"],
             contents=prompt
-        )
+        ))
 
         # ✅ Safely extract response text
         try:
@@ -51,9 +360,8 @@ class ModelManager:
                 return str(response)
 
     def _ollama_generate(self, prompt: str) -> str:
-        response = requests.post(
+        response = model_client.post_json(
             self.model_info["url"]["generate"],
-            json={"model": self.model_info["model"], "prompt": prompt, "stream": False}
+            {"model": self.model_info["model"], "prompt": prompt, "stream": False}
         )
-        response.raise_for_status()
-        return response.json()["response"].strip()
+        return response["response"].strip()
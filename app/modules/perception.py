@@ -4,7 +4,7 @@ import os
 import re
 import json
 from dotenv import load_dotenv
-from modules.model_manager import ModelManager
+from modules.model_manager import ModelManager, classify_difficulty
 from modules.tools import summarize_tools
 
 model = ModelManager()
@@ -13,9 +13,53 @@ tool_context = summarize_tools(model.get_all_tools()) if hasattr(model, "get_all
 
 class PerceptionResult(BaseModel):
     user_input: str
-    intent: Optional[str]
+    intent: Optional[str] = None
     entities: List[str] = []
     tool_hint: Optional[str] = None
+    single_step: Optional[bool] = None  # one tool call fully answers the request
+
+
+def _rule_perception(user_input: str) -> Optional[str]:
+    """
+    Perception for a short arithmetic request with numbers in it, without a model.
+    None when the input isn't that simple.
+    """
+    numbers = re.findall(r"-?\d+(?:\.\d+)?", user_input)
+    if not numbers or classify_difficulty(user_input) != "simple":
+        return None
+    return json.dumps({
+        "intent": "arithmetic calculation",
+        "entities": numbers,
+        "tool_hint": "evaluate_expression",
+        "user_input": user_input,
+    })
+
+
+def _parse_perception(response: str, user_input: str) -> PerceptionResult:
+    """Parse a model's perception reply; raises ValueError if it isn't a usable dict."""
+    # Clean up raw if wrapped in markdown-style ```json
+    raw = response.strip()
+    if not raw or raw.lower() in ["none", "null", "undefined"]:
+        raise ValueError("Empty or null model output")
+
+    # Clean and parse
+    clean = re.sub(r"^```json|```$", "", raw, flags=re.MULTILINE).strip()
+    try:
+        parsed = json.loads(clean)
+    except json.JSONDecodeError as json_error:
+        raise ValueError(f"JSON parsing failed: {json_error}") from json_error
+
+    # Ensure Keys
+    if not isinstance(parsed, dict):
+        raise ValueError("Parsed LLM output is not a dict")
+    if "intent" not in parsed:
+        parsed['intent'] = None
+    # Fix common issues
+    if isinstance(parsed.get("entities"), dict):
+        parsed["entities"] = list(parsed["entities"].values())
+
+    parsed["user_input"] = user_input  # overwrite or insert safely
+    return PerceptionResult(**parsed)
 
 
 async def extract_perception(user_input: str) -> PerceptionResult:
@@ -24,6 +68,8 @@ async def extract_perception(user_input: str) -> PerceptionResult:
     - intent: user’s high-level goal
     - entities: keywords or values
     - tool_hint: likely MCP tool name (optional)
+    Routed by difficulty: simple arithmetic may be answered by rules or a small
+    model, falling back to the default model when a reply doesn't parse.
     """
 
     prompt = f"""
@@ -37,44 +83,20 @@ Return the response as a Python dictionary with keys:
 - intent: (brief phrase about what the user wants)
 - entities: a list of strings representing keywords or values (e.g., ["INDIA", "ASCII"])
 - tool_hint: (name of the MCP tool that might be useful, if any)
+- single_step: true only if one tool call fully answers the request, false if results must be combined or fed into further calls
 - user_input: same as above
 
 Output only the dictionary on a single line. Do NOT wrap it in ```json or other formatting. Ensure `entities` is a list of strings, not a dictionary.
 """
 
     try:
-        response = await model.generate_text(prompt)
-
-        # Clean up raw if wrapped in markdown-style ```json
-        raw = response.strip()
-        if not raw or raw.lower() in ["none", "null", "undefined"]:
-            raise ValueError("Empty or null model output")
-
-        # Clean and parse
-        clean = re.sub(r"^```json|```$", "", raw, flags=re.MULTILINE).strip()
-        import json
-
-        try:
-            parsed = json.loads(clean.replace("null", "null"))  # Clean up non-Python nulls
-        except Exception as json_error:
-            print(f"[perception] JSON parsing failed: {json_error}")
-            parsed = {}
-
-        # Ensure Keys
-        if not isinstance(parsed, dict):
-            raise ValueError("Parsed LLM output is not a dict")
-        if "user_input" not in parsed:
-            parsed["user_input"] = user_input
-        if "intent" not in parsed:
-            parsed['intent'] = None
-        # Fix common issues
-        if isinstance(parsed.get("entities"), dict):
-            parsed["entities"] = list(parsed["entities"].values())
-
-        parsed["user_input"] = user_input  # overwrite or insert safely
-        return PerceptionResult(**parsed)
-
-
+        return await model.generate_routed(
+            prompt,
+            parse=lambda response: _parse_perception(response, user_input),
+            call_type="perception",
+            difficulty=classify_difficulty(user_input),
+            rules=lambda: _rule_perception(user_input),
+        )
     except Exception as e:
         print(f"[perception] ⚠️ LLM perception failed: {e}")
         return PerceptionResult(user_input=user_input)
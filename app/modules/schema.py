@@ -0,0 +1,217 @@
+# modules/schema.py → Tool argument schemas
+# Role: Turns MCP `inputSchema` JSON Schemas into fast validators and LLM function declarations.
+
+# Responsibilities:
+
+# Compile a JSON Schema once into a closure that validates and coerces arguments
+
+# Inline $ref/$defs so schemas can be handed to Gemini function calling
+
+# Dependencies: none (pure Python)
+
+# Used by: decision.py, model_manager.py
+
+# modules/schema.py
+
+from typing import Any, Callable, Dict, List
+
+
+class SchemaValidationError(ValueError):
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+Validator = Callable[[Any, str, List[str]], Any]
+
+
+def _resolve(schema: dict, root: dict) -> dict:
+    while "$ref" in schema:
+        ref = schema["$ref"]
+        if not ref.startswith("#/"):
+            raise ValueError(f"Unsupported $ref: {ref}")
+        node = root
+        for part in ref[2:].split("/"):
+            node = node[part]
+        schema = {**node, **{k: v for k, v in schema.items() if k != "$ref"}}
+    return schema
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _compile(schema: dict, root: dict) -> Validator:
+    schema = _resolve(schema, root)
+    checks: List[Validator] = []
+
+    branches = schema.get("anyOf") or schema.get("oneOf")
+    if branches:
+        compiled_branches = [_compile(branch, root) for branch in branches]
+
+        def check_any(value, path, errors):
+            for branch in compiled_branches:
+                branch_errors: List[str] = []
+                coerced = branch(value, path, branch_errors)
+                if not branch_errors:
+                    return coerced
+            errors.append(f"{path or 'value'}: does not match any allowed type")
+            return value
+
+        checks.append(check_any)
+
+    types = schema.get("type")
+    if types:
+        allowed = set(types if isinstance(types, list) else [types])
+
+        def check_type(value, path, errors):
+            if value is None and "null" in allowed:
+                return value
+            if "integer" in allowed:
+                if isinstance(value, int) and not isinstance(value, bool):
+                    return value
+                # Function-calling backends often send 5.0 or "5" for integers
+                if isinstance(value, float) and value.is_integer():
+                    return int(value)
+                if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+                    return int(value)
+            if "number" in allowed:
+                if _is_number(value):
+                    return value
+                if isinstance(value, str):
+                    try:
+                        return float(value)
+                    except ValueError:
+                        pass
+            if "string" in allowed:
+                if isinstance(value, str):
+                    return value
+                if _is_number(value):
+                    return str(value)
+            if "boolean" in allowed and isinstance(value, bool):
+                return value
+            if "array" in allowed and isinstance(value, (list, tuple)):
+                return list(value)
+            if "object" in allowed and isinstance(value, dict):
+                return value
+            errors.append(f"{path or 'value'}: expected {'/'.join(sorted(allowed))}, got {type(value).__name__}")
+            return value
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in options:
+                errors.append(f"{path or 'value'}: must be one of {options}")
+            return value
+
+        checks.append(check_enum)
+
+    properties = {name: _compile(sub, root) for name, sub in schema.get("properties", {}).items()}
+    required = schema.get("required", [])
+    closed = schema.get("additionalProperties") is False
+    if properties or required:
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return value
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path + '.' if path else ''}{name}: missing required field")
+            coerced = dict(value)
+            for name, item in value.items():
+                if name in properties:
+                    coerced[name] = properties[name](item, f"{path + '.' if path else ''}{name}", errors)
+                elif closed:
+                    errors.append(f"{path + '.' if path else ''}{name}: unexpected field")
+            return coerced
+
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = _compile(schema["items"], root)
+
+        def check_items(value, path, errors):
+            if not isinstance(value, list):
+                return value
+            return [item_check(item, f"{path}[{i}]", errors) for i, item in enumerate(value)]
+
+        checks.append(check_items)
+
+    def run(value, path, errors):
+        for check in checks:
+            value = check(value, path, errors)
+        return value
+
+    return run
+
+
+def compile_validator(schema: dict) -> Callable[[Any], Any]:
+    """
+    Compile `schema` once. The returned function coerces lenient LLM values
+    (e.g. 5.0 → 5) and raises SchemaValidationError listing every problem.
+    """
+    check = _compile(schema or {}, schema or {})
+
+    def validate(value: Any) -> Any:
+        errors: List[str] = []
+        coerced = check(value, "", errors)
+        if errors:
+            raise SchemaValidationError(errors)
+        return coerced
+
+    return validate
+
+
+# Keys Gemini's function-declaration Schema understands
+_GEMINI_KEYS = {"type", "properties", "required", "items", "description", "enum", "nullable", "format"}
+
+
+def to_gemini_schema(schema: dict, root: dict = None) -> Dict[str, Any]:
+    """Inline $refs, collapse Optional[...] anyOf and drop keys Gemini rejects."""
+    root = root if root is not None else schema
+    schema = _resolve(schema, root)
+
+    branches = schema.get("anyOf") or schema.get("oneOf")
+    if branches:
+        non_null = [b for b in branches if _resolve(b, root).get("type") != "null"]
+        merged = to_gemini_schema(non_null[0] if non_null else {"type": "string"}, root)
+        if len(non_null) < len(branches):
+            merged["nullable"] = True
+        if "description" in schema:
+            merged["description"] = schema["description"]
+        return merged
+
+    out: Dict[str, Any] = {k: v for k, v in schema.items() if k in _GEMINI_KEYS}
+    types = schema.get("type", "object" if "properties" in schema else "string")
+    if isinstance(types, list):
+        non_null = [t for t in types if t != "null"]
+        out["nullable"] = len(non_null) < len(types)
+        types = non_null[0] if non_null else "string"
+    out["type"] = types.upper()
+
+    if "properties" in schema:
+        out["properties"] = {name: to_gemini_schema(sub, root) for name, sub in schema["properties"].items()}
+    if "items" in schema:
+        out["items"] = to_gemini_schema(schema["items"], root)
+    elif out["type"] == "ARRAY":
+        out["items"] = {"type": "STRING"}
+    return out
+
+
+def validate_arguments(validate: Callable[[Any], Any], schema: dict, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate `arguments`; for single-`input` tools also accept the unwrapped form
+    (e.g. {"string": "INDIA"} for a tool whose schema is {"input": {...}}).
+    """
+    try:
+        return validate(arguments)
+    except SchemaValidationError as first_error:
+        if list(schema.get("properties", {})) == ["input"] and "input" not in arguments:
+            try:
+                return validate({"input": arguments})
+            except SchemaValidationError:
+                pass
+        raise first_error
@@ -1,6 +1,16 @@
 # modules/tools.py
 
-from typing import List, Dict, Optional, Any
+import json
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, List, Dict, Optional, Any
+import numpy as np
+from modules.schema import compile_validator, to_gemini_schema
+
+TOOL_EMBEDDINGS_CACHE = Path(
+    os.getenv("TOOL_EMBEDDINGS_CACHE", Path(__file__).parent.parent / "faiss_index" / "tool_embeddings.json")
+)
 
 
 def summarize_tools(tools: List[Any]) -> str:
@@ -33,9 +43,118 @@ def get_tool_map(tools: List[Any]) -> Dict[str, Any]:
     """
     return {tool.name: tool for tool in tools}
 
-def tool_expects_input(self, tool_name: str) -> bool:
-    tool = next((t for t in self.tools if t.name == tool_name), None)
-    if not tool or not hasattr(tool, 'parameters') or not isinstance(tool.parameters, dict):
-        return False
-    # If the top-level parameter is just 'input', we assume wrapping is required
-    return list(tool.parameters.keys()) == ['input']
+
+class ToolIndex:
+    """
+    Embeds every tool's name + description once (cached on disk by text and
+    embedding model) and returns the tools most similar to a query.
+    """
+
+    def __init__(self, tools: List[Any], embed: Callable[[str], np.ndarray], model_name: str):
+        self.tools = list(tools)
+        self.embed = embed
+
+        cache = json.loads(TOOL_EMBEDDINGS_CACHE.read_text()) if TOOL_EMBEDDINGS_CACHE.exists() else {}
+        dirty = False
+        vectors = []
+        for tool in self.tools:
+            text = f"{tool.name}: {getattr(tool, 'description', '') or ''}"
+            key = hashlib.sha1(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+            if key not in cache:
+                cache[key] = [float(x) for x in embed(text)]
+                dirty = True
+            vectors.append(cache[key])
+        if dirty:
+            TOOL_EMBEDDINGS_CACHE.parent.mkdir(exist_ok=True)
+            TOOL_EMBEDDINGS_CACHE.write_text(json.dumps(cache))
+
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(self.tools), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.maximum(norms, 1e-12)
+
+    def search(self, query: str, top_n: int) -> List[Any]:
+        if not self.tools:
+            return []
+        query_vec = np.asarray(self.embed(query), dtype=np.float32)
+        query_vec /= max(float(np.linalg.norm(query_vec)), 1e-12)
+        scores = self.matrix @ query_vec
+        top = np.argsort(-scores)[:top_n]
+        return [self.tools[i] for i in top]
+
+
+class ToolRegistry:
+    """
+    Everything the planner needs about a tool catalog, computed once per catalog
+    version: name index, prompt summaries, compiled validators, function
+    declarations and input-wrapping rules. Lookups are then O(1) per step.
+    """
+
+    _cache: Dict[int, "ToolRegistry"] = {}
+
+    @classmethod
+    def for_tools(cls, tools: List[Any]) -> "ToolRegistry":
+        version = cls.catalog_version(tools)
+        if version not in cls._cache:
+            cls._cache[version] = cls(tools, version)
+        return cls._cache[version]
+
+    @staticmethod
+    def catalog_version(tools: List[Any]) -> int:
+        return hash(tuple(
+            (t.name, getattr(t, "description", None), json.dumps(getattr(t, "inputSchema", None), sort_keys=True))
+            for t in tools
+        ))
+
+    def __init__(self, tools: List[Any], version: int):
+        self.version = version
+        self.tools = list(tools)
+        self.by_name = get_tool_map(self.tools)
+        self.summaries = {t.name: summarize_tools([t]) for t in self.tools}
+        self.full_summary = "\n".join(self.summaries.values())
+        self.schemas = {t.name: getattr(t, "inputSchema", None) or {} for t in self.tools}
+        self.validators = {name: compile_validator(schema) for name, schema in self.schemas.items()}
+        self.functions = {
+            t.name: {
+                "name": t.name,
+                "description": getattr(t, "description", "") or "",
+                "parameters": self.schemas[t.name],
+                "gemini_parameters": to_gemini_schema(self.schemas[t.name]) if self.schemas[t.name].get("properties") else None,
+            }
+            for t in self.tools
+        }
+        # Tools whose only parameter is `input` take their arguments wrapped as {"input": {...}}
+        self.wraps_input = {
+            name: list(schema.get("properties", {})) == ["input"] for name, schema in self.schemas.items()
+        }
+        self._hint_cache: Dict[Optional[str], List[Any]] = {}
+        self._summary_cache: Dict[Optional[str], str] = {}
+        self._tool_index: Optional[ToolIndex] = None
+
+    def get(self, name: str) -> Optional[Any]:
+        return self.by_name.get(name)
+
+    def expects_input(self, name: str) -> bool:
+        return self.wraps_input.get(name, False)
+
+    def filter_by_hint(self, hint: Optional[str] = None) -> List[Any]:
+        if hint not in self._hint_cache:
+            if len(self._hint_cache) > 256:
+                self._hint_cache.clear()
+                self._summary_cache.clear()
+            self._hint_cache[hint] = filter_tools_by_hint(self.tools, hint)
+        return self._hint_cache[hint]
+
+    def summarize(self, hint: Optional[str] = None) -> str:
+        """Prompt fragment describing the tools selected by `hint`."""
+        if hint not in self._summary_cache:
+            self._summary_cache[hint] = self.summarize_tools(self.filter_by_hint(hint))
+        return self._summary_cache[hint]
+
+    def summarize_tools(self, tools: List[Any]) -> str:
+        return "\n".join(self.summaries[t.name] for t in tools)
+
+    def tool_index(self, embed: Callable[[str], np.ndarray], model_name: str) -> ToolIndex:
+        """Vector index over this catalog, built on first use."""
+        if self._tool_index is None:
+            self._tool_index = ToolIndex(self.tools, embed, model_name)
+        return self._tool_index
@@ -0,0 +1,302 @@
+# modules/tracing.py → Latency Tracing
+# Role: Lightweight spans that show where an agent run spends its time.
+
+# Responsibilities:
+
+# Open nested spans (contextvars, so they follow asyncio tasks) around each stage
+
+# Propagate the trace to MCP servers as a W3C `traceparent` in request `_meta`
+
+# Append finished spans to a JSONL sink shared by the agent and server processes
+
+# CLI: per-stage latency breakdown and percentiles across recorded traces
+
+# Dependencies: none (standard library)
+
+# Used by: loop.py, session.py, model_manager.py, memory.py, mcp_server_*.py
+
+# Usage:
+#   python -m modules.tracing              # stage percentiles over all traces
+#   python -m modules.tracing --last 20    # ... over the 20 most recent traces
+#   python -m modules.tracing --trace <id> # span tree for one trace
+
+# modules/tracing.py
+
+import argparse
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).parent.parent
+TRACE_FILE = Path(os.environ.get("AGENT_TRACE_FILE", ROOT / "logs" / "traces.jsonl"))
+TRACING_ENABLED = os.environ.get("AGENT_TRACING", "1") != "0"
+SERVICE = os.environ.get("AGENT_SERVICE", "agent")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    parent_id: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    _t0: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the span started."""
+        return (time.perf_counter() - self._t0) * 1000
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current.get()
+    return span.traceparent() if span else None
+
+
+def _parse_traceparent(value: Optional[str]):
+    try:
+        _, trace_id, parent_id, _ = value.split("-")
+        return trace_id, parent_id
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def _export(record: dict) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        try:
+            TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            # One short O_APPEND write per span keeps lines intact across processes
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attrs):
+    """
+    Time the enclosed block as a child of the current span (or of `traceparent`,
+    for spans continuing a trace from another process).
+    """
+    if not TRACING_ENABLED:
+        yield Span(name=name, trace_id="")
+        return
+
+    parent = _current.get()
+    trace_id, parent_id = _parse_traceparent(traceparent)
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        parent_id = parent.span_id if parent else None
+
+    current = Span(name=name, trace_id=trace_id, parent_id=parent_id, attrs=dict(attrs))
+    token = _current.set(current)
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        _current.reset(token)
+        _export({
+            "trace_id": current.trace_id,
+            "span_id": current.span_id,
+            "parent_id": current.parent_id,
+            "name": current.name,
+            "service": SERVICE,
+            "start": current.start,
+            "duration_ms": round(current.elapsed_ms(), 3),
+            "status": status,
+            "attrs": current.attrs,
+        })
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of `span` for sync and async functions."""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def trace_server_tools(mcp, service: str) -> None:
+    """
+    Wrap a FastMCP server's tool dispatch so each call records a `server.tool`
+    span parented to the client's `_meta.traceparent`.
+    """
+    global SERVICE
+    SERVICE = service
+    manager = mcp._tool_manager
+    call_tool = manager.call_tool
+
+    async def traced_call_tool(name, arguments, *args, **kwargs):
+        context = kwargs.get("context", args[0] if args else None)
+        try:
+            meta = context.request_context.meta
+        except (AttributeError, LookupError, ValueError):  # no context, or called outside a request
+            meta = None
+        parent = getattr(meta, "traceparent", None)
+        with span("server.tool", traceparent=parent, tool=name):
+            return await call_tool(name, arguments, *args, **kwargs)
+
+    manager.call_tool = traced_call_tool
+
+
+# ----------------------------------------------------------------------
+# CLI: latency report
+# ----------------------------------------------------------------------
+
+def load_spans(path: Path = TRACE_FILE) -> List[dict]:
+    if not path.exists():
+        return []
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # partially written line
+    return spans
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def stage_report(spans: List[dict]) -> List[dict]:
+    """Latency percentiles per span name, plus its share of total agent.run time."""
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(s["duration_ms"])
+    run_total = sum(by_name.get("agent.run", [])) or None
+
+    rows = []
+    for name, values in by_name.items():
+        rows.append({
+            "stage": name,
+            "count": len(values),
+            "total_ms": sum(values),
+            "p50_ms": percentile(values, 50),
+            "p90_ms": percentile(values, 90),
+            "p99_ms": percentile(values, 99),
+            "max_ms": max(values),
+            "share": sum(values) / run_total if run_total else None,
+        })
+    return sorted(rows, key=lambda r: -r["total_ms"])
+
+
+def print_stage_report(rows: List[dict], trace_count: int) -> None:
+    print(f"Stage latency over {trace_count} trace(s)\n")
+    print(f"{'stage':<24}{'count':>7}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'max ms':>11}{'% run':>8}")
+    for r in rows:
+        share = f"{r['share'] * 100:.1f}" if r["share"] is not None else "-"
+        print(
+            f"{r['stage']:<24}{r['count']:>7}{r['p50_ms']:>11.1f}{r['p90_ms']:>11.1f}"
+            f"{r['p99_ms']:>11.1f}{r['max_ms']:>11.1f}{share:>8}"
+        )
+
+
+def print_trace_tree(spans: List[dict]) -> None:
+    children: Dict[Optional[str], List[dict]] = defaultdict(list)
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start"]):
+        children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+    t0 = min(s["start"] for s in spans)
+
+    def walk(parent_id, depth):
+        for s in children.get(parent_id, []):
+            attrs = " ".join(f"{k}={v}" for k, v in s["attrs"].items())
+            flag = "" if s["status"] == "ok" else f" [{s['status']}]"
+            print(
+                f"{(s['start'] - t0) * 1000:>9.1f} ms  {'  ' * depth}{s['name']} "
+                f"({s['duration_ms']:.1f} ms, {s['service']}){flag} {attrs}".rstrip()
+            )
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Per-stage latency report from agent traces")
+    parser.add_argument("--file", type=Path, default=TRACE_FILE)
+    parser.add_argument("--last", type=int, help="only the N most recent traces")
+    parser.add_argument("--trace", help="print the span tree for one trace id (prefix ok)")
+    parser.add_argument("--json", action="store_true", help="emit the stage report as JSON")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.file)
+    if not spans:
+        print(f"No spans in {args.file}")
+        return
+
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for s in spans:
+        traces[s["trace_id"]].append(s)
+
+    if args.trace:
+        matches = [t for t in traces if t.startswith(args.trace)]
+        if not matches:
+            print(f"No trace matching {args.trace}")
+            return
+        print_trace_tree(traces[matches[0]])
+        return
+
+    ordered = sorted(traces, key=lambda t: min(s["start"] for s in traces[t]))
+    if args.last:
+        ordered = ordered[-args.last:]
+    selected = [s for t in ordered for s in traces[t]]
+
+    rows = stage_report(selected)
+    if args.json:
+        print(json.dumps({"traces": len(ordered), "stages": rows}, indent=2))
+    else:
+        print_stage_report(rows, len(ordered))
+        print(f"\nLatest trace: {ordered[-1]}  (python -m modules.tracing --trace {ordered[-1][:8]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# sandbox.py → Pooled Python sandbox for run_python_sandbox
+# Role: Runs untrusted snippets in warm worker processes instead of the MCP server process.
+
+# Responsibilities:
+
+# Keep a few worker processes alive with math/numpy already imported; workers are
+# `python -m sandbox` processes, so they never import the MCP server that uses them
+
+# Apply per-call CPU time and address-space (memory) limits; the memory limit is headroom
+# above what the worker has mapped once warm
+
+# Capture stdout per worker, kill runaway workers and recycle them after N runs
+
+# Used by: mcp_server_1.py
+
+import builtins
+import io
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import resource  # POSIX only; on Windows only the wall-clock timeout applies
+except ImportError:
+    resource = None
+
+APP_ROOT = Path(__file__).resolve().parent
+
+
+def _set_cpu_limit(seconds: int) -> None:
+    if resource is None:
+        return
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    spent = int(used.ru_utime + used.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (spent + seconds, hard))
+
+
+def _on_cpu_limit(signum, frame):
+    raise TimeoutError("CPU time limit exceeded")
+
+
+def _address_space_bytes() -> int:
+    """This process's current virtual memory size (0 where /proc isn't available)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _serve(memory_mb: int) -> None:
+    """Worker loop: one JSON [code, cpu_seconds] per stdin line in, one JSON [status, output] line out."""
+    # Keep the request/reply pipes for ourselves; snippets get devnull as stdin/stdout
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    import math
+    preloaded = {"math": math}
+    try:
+        import numpy as np
+        preloaded.update(np=np, numpy=np)
+    except ImportError:
+        pass
+
+    if resource is not None:
+        limit = _address_space_bytes() + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    for line in requests:
+        code, cpu_seconds = json.loads(line)
+        buffer = io.StringIO()
+        sys.stdout = buffer
+        status = "ok"
+        try:
+            _set_cpu_limit(cpu_seconds)
+            local_vars = {}
+            exec(code, {"__builtins__": builtins, **preloaded}, local_vars)
+            output = str(local_vars.get("result", buffer.getvalue().strip() or "Executed."))
+        except MemoryError:
+            status, output = "recycle", "ERROR: Memory limit exceeded"
+        except TimeoutError as e:
+            status, output = "recycle", f"ERROR: {e}"
+        except Exception as e:
+            output = f"ERROR: {e}"
+        finally:
+            sys.stdout = sys.__stdout__
+
+        replies.write(json.dumps([status, output]) + "\n")
+        replies.flush()
+
+
+class _Worker:
+    """A `python -m sandbox` process and a thread that queues its replies."""
+
+    def __init__(self, memory_mb: int):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "sandbox", str(memory_mb)],
+            cwd=APP_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+        )
+        self.replies: "queue.Queue[Optional[list]]" = queue.Queue()
+        self.runs = 0
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self) -> None:
+        for line in self.process.stdout:
+            self.replies.put(json.loads(line))
+        self.replies.put(None)  # the worker exited
+
+    def send(self, code: str, cpu_seconds: int) -> None:
+        self.process.stdin.write(json.dumps([code, cpu_seconds]) + "\n")
+        self.process.stdin.flush()
+
+    def close(self) -> None:
+        try:
+            self.process.stdin.close()  # the worker exits at end of input
+            self.process.wait(timeout=0.5)
+        except Exception:
+            self.process.kill()
+
+
+class SandboxPool:
+    """
+    Up to `size` sandbox processes, started on first use and kept warm between calls.
+    `run()` is blocking and thread-safe; call it from a worker thread when serving
+    async requests.
+    """
+
+    def __init__(self, size: int = 2, cpu_seconds: int = 5, memory_mb: int = 512, max_runs: int = 50):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_runs = max_runs
+        self._slots = threading.Semaphore(size)
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+
+    def run(self, code: str, cpu_seconds: Optional[int] = None) -> str:
+        cpu_seconds = cpu_seconds or self.cpu_seconds
+        wall_seconds = cpu_seconds * 2 + 5
+        with self._slots:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            worker = worker or _Worker(self.memory_mb)
+            keep = False
+            try:
+                worker.send(code, cpu_seconds)
+                # Wall-clock backstop for code stuck in C or sleeping (CPU limit won't fire)
+                reply = worker.replies.get(timeout=wall_seconds)
+                if reply is None:
+                    # Worker died mid-call, e.g. killed at the hard CPU limit
+                    return "ERROR: Sandbox worker crashed (resource limit exceeded?)"
+                status, output = reply
+                worker.runs += 1
+                keep = status != "recycle" and worker.runs < self.max_runs
+                return output
+            except queue.Empty:
+                worker.process.kill()
+                return f"ERROR: Execution timed out after {wall_seconds}s"
+            except OSError:
+                return "ERROR: Sandbox worker crashed (resource limit exceeded?)"
+            finally:
+                if keep:
+                    with self._lock:
+                        self._idle.append(worker)
+                else:
+                    worker.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+
+if __name__ == "__main__":
+    _serve(int(sys.argv[1]))
@@ -0,0 +1,112 @@
+# sql_engine.py → Read-only SQLite engine for run_sql_query
+# Role: Serves bounded, read-only queries from a small pool of reusable connections.
+
+# Responsibilities:
+
+# Open connections with mode=ro + PRAGMA query_only and a prepared-statement cache
+
+# Abort queries that run past a deadline (progress handler)
+
+# Stream rows with row/byte caps and render them as text or columnar JSON
+
+# Used by: mcp_server_1.py
+
+import json
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ReadOnlySQLite:
+    def __init__(
+        self,
+        db_path: str,
+        pool_size: int = 4,
+        timeout_s: float = 5.0,
+        max_rows: int = 200,
+        max_bytes: int = 64_000,
+        statement_cache: int = 256,
+        enable_wal: bool = False,
+    ):
+        self.db_path = Path(db_path).resolve()
+        self.timeout_s = timeout_s
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.statement_cache = statement_cache
+
+        if enable_wal and self.db_path.exists():
+            self._enable_wal()
+
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+    def _enable_wal(self) -> None:
+        # journal_mode is persistent but can't be changed from a read-only handle;
+        # WAL lets our readers run alongside whoever writes the file. Opt-in: this
+        # opens the file read-write once and leaves -wal/-shm files next to it.
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"{self.db_path.as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+        )
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            conn.set_progress_handler(None, 0)
+            self._pool.put(conn)
+
+    def execute(self, sql: str, max_rows: int = None, fmt: str = "text") -> str:
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows must be at least 1")
+        max_rows = min(max_rows or self.max_rows, self.max_rows)
+        deadline = time.monotonic() + self.timeout_s
+
+        with self.connection() as conn:
+            # Returning non-zero interrupts the running statement
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            cursor = conn.execute(sql)
+            columns = [d[0] for d in cursor.description or []]
+
+            rows, size, truncated = [], 0, False
+            while not truncated:
+                batch = cursor.fetchmany(min(100, max_rows - len(rows) + 1))
+                if not batch:
+                    break
+                for row in batch:
+                    size += len(str(row)) + 1
+                    if len(rows) >= max_rows or size > self.max_bytes:
+                        truncated = True
+                        break
+                    rows.append(row)
+            cursor.close()
+
+        if fmt == "json":
+            return json.dumps({
+                "columns": columns,
+                "data": {col: [row[i] for row in rows] for i, col in enumerate(columns)},
+                "row_count": len(rows),
+                "truncated": truncated,
+            }, default=str)
+
+        result = "\n".join(str(row) for row in rows)
+        if truncated:
+            result += f"\n... [truncated after {len(rows)} rows]"
+        return result
@@ -1,6 +1,8 @@
 import logging
 import os
+import time
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 from config import BOT_TOKEN
 
@@ -30,7 +32,29 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text('I can respond to /start and /help commands!')
 
 import asyncio
-from agent import main as agent_main
+from agent import stream as agent_stream
+
+# Telegram rate-limits message edits; push streamed text at most this often
+EDIT_INTERVAL_S = 1.0
+
+
+def _status_line(event: dict) -> str | None:
+    """Short progress text for an agent event, or None if it isn't worth showing."""
+    if event["type"] == "step":
+        return f"🔁 Step {event['step']}/{event['max_steps']}…"
+    if event["type"] == "tool_start":
+        return f"🛠️ Running {event['tool']}…"
+    if event["type"] == "plan" and event["kind"] == "function_call":
+        return f"🧭 Planned {event['tool']}"
+    return None
+
+
+async def _edit(reply, text: str) -> None:
+    try:
+        await reply.edit_text(text)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
 
 async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Log message, call agent, and respond."""
@@ -54,13 +78,27 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     logger.info(f'Received message from {user.first_name} (@{user.username}): {message}')
     
-    # Call agent's main method with the message
+    # Stream the agent's progress and answer into one message, edited in place
     try:
-        # Run agent main method with the message and get the response
-        agent_response = await agent_main(external_input=message)
-        
-        # Send back the agent's response
-        await update.message.reply_text(agent_response or "I processed your request, but no response was generated.")
+        reply = await update.message.reply_text("🧠 Thinking…")
+        shown, answer, last_edit = "🧠 Thinking…", "", time.monotonic()
+        async for event in agent_stream(message):
+            if event["type"] == "final":
+                answer = event["answer"]
+                break
+            if event["type"] == "answer_token":
+                answer += event["text"]
+                text = answer.strip()
+            else:
+                text = _status_line(event)
+            if not text or text == shown or time.monotonic() - last_edit < EDIT_INTERVAL_S:
+                continue
+            await _edit(reply, text)
+            shown, last_edit = text, time.monotonic()
+
+        final_text = answer.strip() or "I processed your request, but no response was generated."
+        if final_text != shown:
+            await _edit(reply, final_text)
     except Exception as e:
         logger.error(f'Error processing message: {e}')
         await update.message.reply_text(f'Sorry, I encountered an error: {e}')